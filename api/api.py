@@ -2,21 +2,36 @@ import json
 import os
 import typing
 
-import stanza
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 
 from api.utils import convert_stanza_to_dataclass, get_predictions_for_input, load_document
+from api.updater import start_model_updater
+
+if typing.TYPE_CHECKING:
+    import stanza
 
 app = Flask(__name__)
 CORS(app, resources={r'/*': {"origins": '*'}})
 
+RESULTS_DIR = os.environ.get('RESULTS_DIR', '/results')
+
+# updates the good model from the annotation results in the background (see api.updater),
+# if the documents it was trained on and the holdout documents are configured
+if 'MODEL_UPDATE_TRAIN_PATH' in os.environ or 'MODEL_UPDATE_HOLDOUT_PATH' in os.environ:
+    start_model_updater(train_path=os.environ.get('MODEL_UPDATE_TRAIN_PATH', ''),
+                        holdout_path=os.environ.get('MODEL_UPDATE_HOLDOUT_PATH', ''),
+                        results_dir=RESULTS_DIR)
+else:
+    print('Not updating models, MODEL_UPDATE_TRAIN_PATH and MODEL_UPDATE_HOLDOUT_PATH are not set.')
+
 
-def create_nlp_pipeline() -> stanza.Pipeline:
+def create_nlp_pipeline() -> "stanza.Pipeline":
+    import stanza
     return stanza.Pipeline(lang='en', processors={'tokenize': 'spacy'})
 
 
-nlp: typing.Optional[stanza.Pipeline] = None
+nlp: typing.Optional["stanza.Pipeline"] = None
 
 
 @app.route('/annotate', methods=['POST'])
@@ -63,7 +78,7 @@ def save_results():
     user_id = result_json["userId"]
     task_id = result_json["taskId"]
 
-    results_folder = f"/results/{user_id}"
+    results_folder = os.path.join(RESULTS_DIR, user_id)
     os.makedirs(results_folder, exist_ok=True)
     results_file = f"{results_folder}/{task_id}.json"
 
@@ -76,11 +91,11 @@ def save_results():
 @app.route("/results", methods=["GET"])
 def load_results():
     response = {}
-    for user_id in os.listdir("/results"):
+    for user_id in os.listdir(RESULTS_DIR):
         response[user_id] = {}
 
-        for task_results in os.listdir(f"/results/{user_id}"):
-            with open(f"/results/{user_id}/{task_results}", "r", encoding="utf8") as f:
+        for task_results in os.listdir(os.path.join(RESULTS_DIR, user_id)):
+            with open(os.path.join(RESULTS_DIR, user_id, task_results), "r", encoding="utf8") as f:
                 result = json.load(f)
 
             task_id = task_results.replace(".json", "")
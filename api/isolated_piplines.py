@@ -1,8 +1,6 @@
 import json
 import typing
 
-from matplotlib import pyplot as plt
-
 import data
 import pipeline
 from pipeline import Pipeline, PipelineResult
@@ -20,9 +18,9 @@ class IsolatedPipeline(Pipeline):
 
         print(f"Running {self.description()}")
         if train_documents is not None:
-            train_documents = [d.copy() for d in train_documents]
+            train_documents = [d.copy(share_annotations=True) for d in train_documents]
         if test_documents is not None:
-            test_documents = [d.copy() for d in test_documents]
+            test_documents = [d.copy(share_annotations=True) for d in test_documents]
 
         if training_only:
             for s in self._steps:
@@ -38,7 +36,7 @@ class IsolatedPipeline(Pipeline):
                     predictions=result,
                     stats={}
                 )
-                test_documents = [d.copy() for d in result]
+                test_documents = [d.copy(share_annotations=True) for d in result]
             return pipeline_result
 
         print(f"Finished {self.description()}")
@@ -63,7 +61,7 @@ def train_ner_pipeline():
 
 def predict_ner_pipline():
     testing_set = provide_test_data()
-    ground_truth = [d.copy() for d in testing_set]
+    ground_truth = [d.copy(share_annotations=True) for d in testing_set]
 
     metrics_data = []
     num_docs = []
@@ -111,6 +109,7 @@ def train_re_pipline():
                 depth=8,
                 class_weighting=0,
                 num_passes=1,
+                feature_cache_dir="api/models/catboost/features",
             )
         ],
     )
@@ -119,7 +118,7 @@ def train_re_pipline():
 
 def predict_re_pipline():
     testing_set = provide_test_data()
-    ground_truth = [d.copy() for d in testing_set]
+    ground_truth = [d.copy(share_annotations=True) for d in testing_set]
 
     metrics_data = []
     num_docs = []
@@ -184,6 +183,8 @@ def provide_test_data():
 
 
 def plot_results(metrics_data, num_docs):
+    from matplotlib import pyplot as plt
+
     precision_scores = [score.p * 100 for score in metrics_data]
     recall_scores = [score.r * 100 for score in metrics_data]
     f1_scores = [score.f1 * 100 for score in metrics_data]
@@ -219,6 +220,8 @@ def save_f1_data(run_id, f1_scores, num_docs, filename="f1_scores.json"):
 
 
 def plot_f1_scores():
+    from matplotlib import pyplot as plt
+
     with open("f1_scores.json", "r") as file:
         all_runs = json.load(file)
 
@@ -0,0 +1,335 @@
+import glob
+import json
+import os
+import pathlib
+import tempfile
+import threading
+import traceback
+import typing
+
+import data
+import mentions
+import relations
+from api import utils
+from eval import metrics
+
+# spelling of the tags in the training data, results may use a different case
+_NER_TAGS = ['Activity', 'Actor', 'Activity Data', 'Condition Specification',
+             'Further Specification', 'AND Gateway', 'XOR Gateway']
+_RELATION_TAGS = ['flow', 'uses', 'actor performer', 'actor recipient', 'further specification', 'same gateway']
+
+_DOCUMENT_KEYS = ('tokens', 'mentions', 'entities', 'relations')
+
+
+def document_from_result(result: typing.Dict[str, typing.Any]) -> typing.Optional[data.Document]:
+    """
+    Converts an annotation result, as stored by api.api.save_results, into a training document.
+    The annotated document is either the result itself or one of its fields.
+
+    :returns: the document, or None if the result does not hold a valid one
+    """
+    document_json = _find_document_json(result)
+    if document_json is None:
+        print(f'Skipping result of task {result.get("taskId")}, it contains no annotated document.')
+        return None
+
+    document_json = dict(document_json)
+    document_json.setdefault('id', str(result.get('taskId', '')))
+    document_json.setdefault('name', str(result.get('taskId', '')))
+    document_json.setdefault('category', '')
+    document_json.setdefault('text', ' '.join(t.get('text', '') for t in document_json['tokens']))
+
+    try:
+        problem = _normalize_tags(document_json)
+        if problem is None:
+            document = data.loader.read_document_from_json(document_json)
+            problem = _document_problem(document)
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        problem = f'it is malformed ({e!r})'
+    if problem is not None:
+        print(f'Skipping result of task {result.get("taskId")}, {problem}.')
+        return None
+    return document
+
+
+def _find_document_json(result: typing.Dict[str, typing.Any]) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    if all(k in result for k in _DOCUMENT_KEYS):
+        return result
+    for value in result.values():
+        if isinstance(value, dict) and all(k in value for k in _DOCUMENT_KEYS):
+            return value
+    return None
+
+
+def _normalize_tags(document_json: typing.Dict[str, typing.Any]) -> typing.Optional[str]:
+    """
+    Changes tags to their spelling in the training data, in place.
+
+    :returns: a description of the problem, if there are unknown tags
+    """
+    ner_tags = {t.lower(): t for t in _NER_TAGS}
+    json_mentions = [dict(m) for m in document_json['mentions']]
+    for json_mention in json_mentions:
+        if json_mention['type'].lower() not in ner_tags:
+            return f'it contains a mention with unknown tag "{json_mention["type"]}"'
+        json_mention['type'] = ner_tags[json_mention['type'].lower()]
+    json_relations = [dict(r) for r in document_json['relations']]
+    for json_relation in json_relations:
+        if json_relation['type'].lower() not in _RELATION_TAGS:
+            return f'it contains a relation with unknown tag "{json_relation["type"]}"'
+        json_relation['type'] = json_relation['type'].lower()
+    document_json['mentions'] = json_mentions
+    document_json['relations'] = json_relations
+    return None
+
+
+def _document_problem(document: data.Document) -> typing.Optional[str]:
+    if len(document.tokens) == 0:
+        return 'it has no tokens'
+    sentence_indices = [t.sentence_index for t in document.tokens]
+    if sentence_indices[0] != 0 or any(b - a not in (0, 1) for a, b in zip(sentence_indices, sentence_indices[1:])):
+        return 'its tokens are not ordered by sentence'
+    if len(document.mentions) == 0:
+        return 'it has no mentions'
+    for mention in document.mentions:
+        indices = mention.token_document_indices
+        if len(indices) == 0 or not all(0 <= i < len(document.tokens) for i in indices):
+            return f'it has a mention with invalid tokens {indices}'
+        if len({document.tokens[i].sentence_index for i in indices}) != 1:
+            return f'it has a mention spanning multiple sentences {indices}'
+    for entity in document.entities:
+        if not all(0 <= i < len(document.mentions) for i in entity.mention_indices):
+            return f'it has an entity with invalid mentions {entity.mention_indices}'
+    for relation in document.relations:
+        if not (0 <= relation.head_mention_index < len(document.mentions)
+                and 0 <= relation.tail_mention_index < len(document.mentions)):
+            return f'it has a relation between invalid mentions {relation}'
+        if relation.head_mention_index == relation.tail_mention_index:
+            return f'it has a relation of a mention with itself {relation}'
+    return None
+
+
+class ModelUpdater(threading.Thread):
+    """
+    Background thread, that periodically converts new annotation results into training documents,
+    and updates the served models of one model type with them (see utils.ModelRegistry):
+    the cat-boost relation model continues training from the current one, on the new documents
+    and the original training documents (which it must not forget). The crf mention model is
+    retrained from the cached features of the original training documents and all results so far.
+    An updated model only replaces the current one, if it does not score worse on the holdout documents.
+
+    :param train_documents: documents the current models were trained on
+    :param holdout_documents: documents updated models are compared to the current ones on,
+                              need entities to predict relations
+    :param interval: seconds between two checks for new results
+    :param min_new_documents: number of new or changed results needed to update the models
+    :param num_trees: trees added to the relation model per update, see CatBoostRelationEstimator.continue_training
+    :param max_trees: number of trees the relation model may grow to, twice its initial trees if not given
+    :param tolerance: how much lower the holdout f1 of an updated model may be
+    :param persist: write accepted models to their model files, bundles are not rewritten
+    """
+
+    def __init__(self, train_documents: typing.List[data.Document],
+                 holdout_documents: typing.List[data.Document], *,
+                 results_dir: str = '/results',
+                 model_type: str = 'good model',
+                 interval: float = 600.0,
+                 min_new_documents: int = 5,
+                 num_trees: int = 10,
+                 max_trees: int = None,
+                 tolerance: float = 0.0,
+                 persist: bool = True,
+                 registry: utils.ModelRegistry = utils.registry):
+        super().__init__(name='model updater', daemon=True)
+        assert len(holdout_documents) > 0
+        self._train_documents = train_documents
+        self._holdout_documents = holdout_documents
+        self._results_dir = results_dir
+        self._model_type = model_type
+        self._interval = interval
+        self._min_new_documents = min_new_documents
+        self._num_trees = num_trees
+        self._max_trees = max_trees
+        self._tolerance = tolerance
+        self._persist = persist
+        self._registry = registry
+        self._stopped = threading.Event()
+
+        # result file -> modification time when it was read
+        self._read_results: typing.Dict[str, float] = {}
+        # result file -> document of its latest valid version, a re-saved result replaces the earlier one
+        self._result_documents: typing.Dict[str, data.Document] = {}
+        # result files, that changed since the last update
+        self._new_results: typing.Set[str] = set()
+        # result files, whose current document the current relation model was not trained on
+        self._pending_relation_results: typing.Set[str] = set()
+        # crf features and labels of the training documents, see training_sequences
+        self._train_sequences: typing.Optional[typing.List] = None
+        # result file -> crf features and labels of its document
+        self._result_sequences: typing.Dict[str, typing.List] = {}
+
+    def run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            try:
+                self.update()
+            except Exception:
+                # keep serving the current models, retry with the next check
+                traceback.print_exc()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def update(self) -> bool:
+        """
+        Reads new results and updates the models, if there are enough new documents.
+
+        :returns: if any model was replaced
+        """
+        self._read_new_results()
+        if len(self._new_results) < self._min_new_documents:
+            return False
+        print(f'Updating {self._model_type} with {len(self._new_results)} new or changed results.')
+        self._pending_relation_results.update(self._new_results)
+        self._new_results = set()
+
+        mention_estimator, relation_estimator = self._registry.estimators(self._model_type)
+        replaced_mentions = self._update_mention_model(mention_estimator)
+        try:
+            replaced_relations = self._update_relation_model(relation_estimator)
+        except Exception:
+            # the mention model is decided on already, the documents stay pending for the next update
+            traceback.print_exc()
+            replaced_relations = False
+        return replaced_mentions or replaced_relations
+
+    def _update_mention_model(self, mention_estimator: mentions.ConditionalRandomFieldsEstimator) -> bool:
+        model_name = utils.mention_model_name(self._model_type)
+        # trained outside of the served models, written there only if it is accepted
+        with tempfile.TemporaryDirectory() as candidate_dir:
+            trainer = mentions.ConditionalRandomFieldsEstimator(pathlib.Path(candidate_dir, model_name))
+            if self._train_sequences is None:
+                self._train_sequences = trainer.training_sequences(self._train_documents)
+            for path, document in self._result_documents.items():
+                if path not in self._result_sequences:
+                    self._result_sequences[path] = trainer.training_sequences([document])
+            sequences = list(self._train_sequences)
+            for path in sorted(self._result_sequences):
+                sequences.extend(self._result_sequences[path])
+            trainer.train_on_sequences(sequences)
+            with open(trainer.model_path, 'rb') as f:
+                model_data = f.read()
+        candidate_mention_estimator = mentions.ConditionalRandomFieldsEstimator.load_model_from_bytes(model_name,
+                                                                                                      model_data)
+
+        accepted = self._is_no_regression('mention extraction',
+                                          self._mention_f1(mention_estimator),
+                                          self._mention_f1(candidate_mention_estimator))
+        if accepted:
+            if self._persist:
+                model_path = candidate_mention_estimator.model_path
+                os.makedirs(model_path.parent, exist_ok=True)
+                temporary_path = f'{model_path}.{os.getpid()}.tmp'
+                with open(temporary_path, 'wb') as f:
+                    f.write(model_data)
+                os.replace(temporary_path, model_path)
+            self._registry.swap(self._model_type, mention_estimator=candidate_mention_estimator)
+        return accepted
+
+    def _update_relation_model(self, relation_estimator: "relations.CatBoostRelationEstimator") -> bool:
+        if self._max_trees is None:
+            self._max_trees = 2 * relation_estimator.tree_count
+        num_trees = min(self._num_trees, self._max_trees - relation_estimator.tree_count)
+        if num_trees <= 0:
+            print(f'Not updating the relation model, it has {relation_estimator.tree_count} trees, '
+                  f'at most {self._max_trees} are allowed.')
+            return False
+        pending_documents = [self._result_documents[p] for p in sorted(self._pending_relation_results)
+                             if p in self._result_documents]
+        candidate_relation_estimator = relation_estimator.continue_training(
+            pending_documents + self._train_documents, num_trees=num_trees
+        )
+
+        accepted = self._is_no_regression('relation extraction',
+                                          self._relation_f1(relation_estimator),
+                                          self._relation_f1(candidate_relation_estimator))
+        if accepted:
+            self._pending_relation_results = set()
+            if self._persist:
+                candidate_relation_estimator.save_model()
+            self._registry.swap(self._model_type, relation_estimator=candidate_relation_estimator)
+        return accepted
+
+    def _read_new_results(self) -> None:
+        paths = sorted(glob.glob(os.path.join(self._results_dir, '*', '*.json')))
+        for path in set(self._read_results) - set(paths):
+            # result was deleted
+            self._forget_result(path)
+            del self._read_results[path]
+        for path in paths:
+            modified = os.path.getmtime(path)
+            if self._read_results.get(path) == modified:
+                continue
+            self._read_results[path] = modified
+            # a re-saved result replaces its earlier version, even if the new one is invalid
+            self._forget_result(path)
+            try:
+                with open(path, 'r', encoding='utf8') as f:
+                    result = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f'Skipping result {path}, it can not be read ({e}).')
+                continue
+            if not isinstance(result, dict):
+                print(f'Skipping result {path}, it is no json object.')
+                continue
+            document = document_from_result(result)
+            if document is not None:
+                self._result_documents[path] = document
+                self._new_results.add(path)
+
+    def _forget_result(self, path: str) -> None:
+        if self._result_documents.pop(path, None) is not None:
+            self._new_results.add(path)
+        self._result_sequences.pop(path, None)
+
+    def _is_no_regression(self, task: str, current_f1: float, updated_f1: float) -> bool:
+        accepted = updated_f1 >= current_f1 - self._tolerance
+        print(f'Updated {task} model scores f1 {updated_f1:.3f} on the holdout documents, '
+              f'current one {current_f1:.3f}, {"replacing" if accepted else "keeping"} the current one.')
+        return accepted
+
+    def _mention_f1(self, estimator: mentions.ConditionalRandomFieldsEstimator) -> float:
+        stats = estimator.test(self._holdout_documents)
+        return sum(stats.values(), metrics.Stats(0, 0, 0)).f1
+
+    def _relation_f1(self, estimator: "relations.CatBoostRelationEstimator") -> float:
+        # predictions keep the mentions of the holdout documents, so relations are matched by mention
+        # indices, metrics.relation_f1_stats matches them by entity and needs one entity per mention
+        predictions = estimator.predict([d.copy(clear_relations=True, share_annotations=True)
+                                         for d in self._holdout_documents])
+        stats = metrics.Stats(0, 0, 0)
+        for predicted_document, holdout_document in zip(predictions, self._holdout_documents):
+            predicted = {_relation_key(r) for r in predicted_document.relations}
+            expected = {_relation_key(r) for r in holdout_document.relations}
+            stats += metrics.Stats(num_pred=len(predicted), num_gold=len(expected), num_ok=len(predicted & expected))
+        return stats.f1
+
+
+def _relation_key(relation: data.Relation) -> typing.Tuple[int, int, str]:
+    return relation.head_mention_index, relation.tail_mention_index, relation.canonical_tag
+
+
+def start_model_updater(train_path: str, holdout_path: str, **kwargs) -> ModelUpdater:
+    """
+    Starts a ModelUpdater for the served models, trained on the documents in train_path.
+
+    :param train_path: json lines file of the documents the served models were trained on
+    :param holdout_path: json lines file of the documents updated models are compared on
+    """
+    for name, path in [('training', train_path), ('holdout', holdout_path)]:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f'Can not update models, the {name} documents "{path}" do not exist.')
+    updater = ModelUpdater(data.read_documents_from_json_file(train_path),
+                           data.read_documents_from_json_file(holdout_path),
+                           **kwargs)
+    updater.start()
+    return updater
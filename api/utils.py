@@ -1,10 +1,14 @@
 import json
 import os
+import threading
 import typing
 
 import data
+import mentions
 import pipeline
+import relations
 from api.isolated_piplines import IsolatedPipeline
+from pipeline import bundle
 from data.model import Document, Token
 
 
@@ -34,17 +38,148 @@ def convert_stanza_to_dataclass(stanza_doc):
     )
 
 
+_bundles: typing.Dict[str, bundle.PipelineBundle] = {}
+
+
+def get_bundle(model_type: str) -> typing.Optional[bundle.PipelineBundle]:
+    """
+    Returns the pipeline bundle for the given model type, loading it on first use.
+    Returns None if no bundle was exported for it, see pipeline.bundle.
+    Only the bundle of _RELATION_MODEL_TYPE loads its relation estimator, it is shared by all model types.
+    """
+    if model_type not in _bundles:
+        bundle_path = f'api/models/bundles/{model_type}.bundle'
+        if not os.path.isfile(bundle_path):
+            return None
+        _bundles[model_type] = bundle.load_bundle(bundle_path,
+                                                  load_relation_estimator=model_type == _RELATION_MODEL_TYPE)
+    return _bundles[model_type]
+
+
+# All options share one resident cat-boost model, the good model's, they differ in their mention
+# extraction model and in the fraction of the cat-boost trees used to predict relations. Fractions
+# refer to the trees of the initially loaded model, trees added by updates only serve the good model.
+_RELATION_MODEL_TYPE = 'good model'
+_TREE_FRACTIONS = {
+    'bad model': 0.1,
+    'average model': 0.3,
+    'good model': 1.0,
+}
+
+
+def _default_relation_step(num_prediction_trees: int = None) -> pipeline.CatBoostRelationExtractionStep:
+    return pipeline.CatBoostRelationExtractionStep(name=f'cat-boost re {_RELATION_MODEL_TYPE}',
+                                                   use_pos_features=False, context_size=2,
+                                                   num_trees=100, negative_sampling_rate=40.0,
+                                                   depth=8, class_weighting=0, num_passes=1,
+                                                   num_prediction_trees=num_prediction_trees)
+
+
+def mention_model_name(model_type: str) -> str:
+    return f'crf mention extraction {model_type}'
+
+
+class ModelRegistry:
+    """
+    Estimators the api predicts with, loaded on first use, from the bundle of their model type
+    if there is one, from their model files otherwise. Updated estimators (see api.updater) are
+    swapped in under a lock, so every request predicts with one consistent set of estimators.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mention_estimators: typing.Dict[str, "mentions.ConditionalRandomFieldsEstimator"] = {}
+        self._relation_estimator: typing.Optional["relations.CatBoostRelationEstimator"] = None
+        self._base_tree_count: typing.Optional[int] = None
+
+    def estimators(self, model_type: str) -> typing.Tuple["mentions.ConditionalRandomFieldsEstimator",
+                                                          "relations.CatBoostRelationEstimator"]:
+        """
+        :returns: the current mention estimator of the model type and the shared relation estimator
+        """
+        with self._lock:
+            if model_type not in self._mention_estimators:
+                self._mention_estimators[model_type] = self._load_mention_estimator(model_type)
+            if self._relation_estimator is None:
+                self._relation_estimator = self._load_relation_estimator()
+                self._base_tree_count = self._relation_estimator.tree_count
+            return self._mention_estimators[model_type], self._relation_estimator
+
+    @property
+    def base_tree_count(self) -> typing.Optional[int]:
+        """
+        Number of trees of the first relation estimator, before any updates added trees to it.
+        """
+        with self._lock:
+            return self._base_tree_count
+
+    def swap(self, model_type: str, *,
+             mention_estimator: typing.Optional["mentions.ConditionalRandomFieldsEstimator"] = None,
+             relation_estimator: typing.Optional["relations.CatBoostRelationEstimator"] = None) -> None:
+        """
+        Replaces the given estimators at once, requests already running finish with the old ones.
+        """
+        with self._lock:
+            if mention_estimator is not None:
+                self._mention_estimators[model_type] = mention_estimator
+            if relation_estimator is not None:
+                if self._base_tree_count is None:
+                    self._base_tree_count = relation_estimator.tree_count
+                self._relation_estimator = relation_estimator
+
+    @staticmethod
+    def _load_mention_estimator(model_type: str) -> "mentions.ConditionalRandomFieldsEstimator":
+        model_bundle = get_bundle(model_type)
+        if model_bundle is not None:
+            return model_bundle.mention_estimator
+        return mentions.ConditionalRandomFieldsEstimator.load_model(mention_model_name(model_type))
+
+    @staticmethod
+    def _load_relation_estimator() -> "relations.CatBoostRelationEstimator":
+        relation_bundle = get_bundle(_RELATION_MODEL_TYPE)
+        if relation_bundle is not None:
+            return relation_bundle.relation_estimator
+        return relations.CatBoostRelationEstimator.load_model(_default_relation_step().estimator_config())
+
+
+registry = ModelRegistry()
+
+
+def get_relation_step(model_type: str,
+                      estimator: "relations.CatBoostRelationEstimator",
+                      base_tree_count: int = None) -> pipeline.CatBoostRelationExtractionStep:
+    """
+    Relation extraction step for the given model type, using the resident cat-boost model
+    truncated to the model type's fraction of trees, see _TREE_FRACTIONS.
+
+    :param base_tree_count: number of trees the fractions refer to, all trees of the estimator if not given
+    """
+    fraction = _TREE_FRACTIONS.get(model_type, 1.0)
+    if base_tree_count is None:
+        base_tree_count = estimator.tree_count
+    num_prediction_trees = None if fraction >= 1.0 else max(1, round(base_tree_count * fraction))
+    relation_bundle = get_bundle(_RELATION_MODEL_TYPE)
+    if relation_bundle is not None:
+        relation_step = relation_bundle.catboost_step(num_prediction_trees=num_prediction_trees)
+    else:
+        relation_step = _default_relation_step(num_prediction_trees=num_prediction_trees)
+    relation_step.estimator = estimator
+    return relation_step
+
+
 def get_predictions_for_input(document: data.Document, model_type: str) -> data.Document:
+    mention_estimator, relation_estimator = registry.estimators(model_type)
+    mention_step = pipeline.CrfMentionEstimatorStep(name=mention_model_name(model_type))
+    mention_step.estimator = mention_estimator
+    relation_step = get_relation_step(model_type, relation_estimator, registry.base_tree_count)
     ner_pd = IsolatedPipeline(name=f'complete-pipeline', steps=[
-        pipeline.CrfMentionEstimatorStep(name=f'crf mention extraction {model_type}'),
+        mention_step,
         pipeline.NeuralCoReferenceResolutionStep(name='neural coreference resolution',
                                                  resolved_tags=['Actor', 'Activity Data'],
                                                  cluster_overlap=.5,
                                                  mention_overlap=.5,
                                                  ner_strategy='frequency'),
-        pipeline.CatBoostRelationExtractionStep(name=f'cat-boost re {model_type}', use_pos_features=False,
-                                                context_size=2, num_trees=100, negative_sampling_rate=40.0,
-                                                depth=8, class_weighting=0, num_passes=1)])
+        relation_step])
     pipeline_result = ner_pd.run(test_documents=[document], ground_truth_documents=[document], training_only=False)
 
     assert pipeline_result.step_results, "No results in pipeline_result.step_results"
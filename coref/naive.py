@@ -6,7 +6,7 @@ from coref import util
 
 class NaiveCoRefSolver:
     def __init__(self, resolved_tags: typing.List[str], min_mention_overlap: float = .33):
-        self._tags = resolved_tags
+        self._tags = data.NER_TAGS.ids(resolved_tags)
         self._mention_overlap_threshold = min_mention_overlap
 
     def resolve_co_references(self, documents: typing.List[data.Document]) -> typing.List[data.Document]:
@@ -15,7 +15,7 @@ class NaiveCoRefSolver:
         for document in documents:
             all_matches: typing.Dict[int, typing.Dict[int, float]] = {}
             for mention_index, mention in enumerate(document.mentions):
-                if mention.ner_tag not in self._tags:
+                if mention.ner_tag_id not in self._tags:
                     continue
                 all_matches[mention_index] = self._match_mention(mention, document)
 
@@ -55,7 +55,7 @@ class NaiveCoRefSolver:
             if other == mention:
                 continue
 
-            if other.ner_tag != mention.ner_tag:
+            if other.ner_tag_id != mention.ner_tag_id:
                 continue
 
             mention_token_texts = NaiveCoRefSolver._text_from_mention(mention, document)
@@ -1,16 +1,22 @@
 import collections
+import functools
 import typing
 
-import spacy
-from spacy import tokens
-
 import data
 from coref import util
 
 
 class NeuralCoRefSolver:
-    # loading an english SpaCy model
-    nlp = spacy.load('en_coreference_web_trf')
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def nlp():
+        """
+        The english SpaCy co-reference model, loaded on first use (which takes a while)
+        and shared by all solvers.
+        """
+        import spacy
+
+        return spacy.load('en_coreference_web_trf')
 
     def __init__(self, co_referencable_tags: typing.List[str],
                  ner_tag_strategy: str = 'skip',
@@ -104,11 +110,9 @@ class NeuralCoRefSolver:
         """
         candidates = collections.defaultdict(int)
         for token_index in token_indices:
-            token = document.tokens[token_index]
-            for mention_index, mention in enumerate(document.mentions):
-                if mention.contains_token(token, document):
-                    candidates[mention_index] += 1
-                    break
+            token_mention_indices = document.mention_indices_for_token_index(token_index)
+            if len(token_mention_indices) > 0:
+                candidates[token_mention_indices[0]] += 1
         if len(candidates) == 0:
             # no mention found
             if verbose:
@@ -134,9 +138,12 @@ class NeuralCoRefSolver:
         All token indices are document level!
         """
 
-        doc = self.nlp(spacy.tokens.Doc(self.nlp.vocab, [token.text for token in document.tokens]))
+        from spacy import tokens
+
+        nlp = self.nlp()
+        doc = nlp(tokens.Doc(nlp.vocab, [token.text for token in document.tokens]))
 
-        clusters: typing.List[spacy.tokens.span_group.SpanGroup]
+        clusters: typing.List[tokens.span_group.SpanGroup]
         clusters = [cluster for cluster_id, cluster in doc.spans.items() if cluster_id.startswith('coref_clusters')]
 
         entities = []
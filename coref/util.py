@@ -8,7 +8,7 @@ def resolve_ner_conflicts(document: data.Document,
                           mention_indices: typing.List[int],
                           ner_tag_strategy: str,
                           verbose: bool = False) -> typing.Optional[data.Entity]:
-    ner_tags = [document.mentions[m_id].ner_tag for m_id in mention_indices]
+    ner_tags = [document.mentions[m_id].ner_tag_id for m_id in mention_indices]
     if len(set(ner_tags)) == 1:
         return data.Entity(mention_indices)
 
@@ -31,7 +31,7 @@ def resolve_ner_conflicts(document: data.Document,
                   f'KEEPING mentions of most frequent ner tag in cluster as per ner tag strategy.')
         counter = collections.Counter(ner_tags)
         most_frequent_tag = max(counter.keys(), key=lambda k: counter[k])
-        mention_indices = [i for i in mention_indices if document.mentions[i].ner_tag == most_frequent_tag]
+        mention_indices = [i for i in mention_indices if document.mentions[i].ner_tag_id == most_frequent_tag]
         return data.Entity(mention_indices)
     else:
         raise ValueError(f'Unknown ner strategy "{ner_tag_strategy}"')
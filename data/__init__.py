@@ -1,3 +1,6 @@
 from data.loader import read_documents_from_json_file, read_names
+from data.loader import iter_documents_from_json_file, iter_documents_from_folder
+from data.corpus import CorpusReader, load_corpus, write_corpus
 from data.model import *
-from data.writer import dump_document_to_json
+from data.vocabulary import TagVocabulary, NER_TAGS, RELATION_TAGS
+from data.writer import dump_document_to_json, write_documents_to_json_file, JsonLinesDocumentWriter
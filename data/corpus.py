@@ -0,0 +1,262 @@
+import argparse
+import array
+import mmap
+import os
+import struct
+import sys
+import typing
+
+from data import model
+
+# Binary corpus format, a columnar alternative to the json lines files read by data.loader.
+# All numbers are 32 bit signed integers in the byte order of the machine that wrote the file,
+# strings (document texts, token texts, tags, ...) are stored once in a shared string table.
+#
+# The file starts with a header (magic, format version, byte order marker), followed by
+# a table with offset and length of each section. Sections hold flat arrays:
+#
+#   strings          utf8 data of all strings, concatenated
+#   string_offsets   start of each string in strings, plus the total length
+#   documents        id, category, text, name (string ids) per document
+#   document_offsets start of each document in tokens, mentions, entities and relations,
+#                    4 values per document, plus a final row with the total counts
+#   tokens           text, pos tag (string ids), sentence index per token
+#   mentions         ner tag (string id), start in mention_tokens per mention
+#   mention_tokens   document level token indices of all mentions, concatenated
+#   entities         start in entity_mentions per entity
+#   entity_mentions  mention indices of all entities, concatenated
+#   relations        head mention index, tail mention index, tag (string id) per relation
+#
+# Pointers into the flat arrays (mention_tokens, entity_mentions) are followed by a
+# sentinel in a trailing row, so element i always spans [start(i), start(i + 1)).
+CORPUS_MAGIC = b'PETCORP\x00'
+CORPUS_FORMAT_VERSION = 1
+_BYTE_ORDER_MARK = 0x01020304
+_HEADER_STRUCT = struct.Struct('=8sII')
+_SECTION_STRUCT = struct.Struct('=QQ')
+_SECTIONS = ['strings', 'string_offsets', 'documents', 'document_offsets', 'tokens',
+             'mentions', 'mention_tokens', 'entities', 'entity_mentions', 'relations']
+_ALIGNMENT = 8
+
+_DOCUMENT_COLUMNS = 4
+_TOKEN_COLUMNS = 3
+_MENTION_COLUMNS = 2
+_RELATION_COLUMNS = 3
+
+
+def write_corpus(documents: typing.Iterable[model.Document], corpus_path: str) -> int:
+    """
+    Writes the given documents into a binary corpus file.
+
+    :returns: number of documents written
+    """
+    string_ids: typing.Dict[str, int] = {}
+    strings = bytearray()
+    string_offsets = array.array('i', [0])
+
+    def string_id(value: str) -> int:
+        if value not in string_ids:
+            string_ids[value] = len(string_ids)
+            strings.extend(value.encode('utf8'))
+            string_offsets.append(len(strings))
+        return string_ids[value]
+
+    sections = {name: array.array('i') for name in _SECTIONS if name != 'strings'}
+    sections['string_offsets'] = string_offsets
+    num_documents = 0
+    for document in documents:
+        sections['documents'].extend([string_id(document.id), string_id(document.category),
+                                      string_id(document.text), string_id(document.name)])
+        sections['document_offsets'].extend([len(sections['tokens']) // _TOKEN_COLUMNS,
+                                             len(sections['mentions']) // _MENTION_COLUMNS,
+                                             len(sections['entities']),
+                                             len(sections['relations']) // _RELATION_COLUMNS])
+        for token in document.tokens:
+            sections['tokens'].extend([string_id(token.text), string_id(token.pos_tag), token.sentence_index])
+        for mention in document.mentions:
+            sections['mentions'].extend([string_id(mention.ner_tag), len(sections['mention_tokens'])])
+            sections['mention_tokens'].extend(mention.token_document_indices)
+        for entity in document.entities:
+            sections['entities'].append(len(sections['entity_mentions']))
+            sections['entity_mentions'].extend(entity.mention_indices)
+        for relation in document.relations:
+            sections['relations'].extend([relation.head_mention_index, relation.tail_mention_index,
+                                          string_id(relation.tag)])
+        num_documents += 1
+
+    # trailing rows, see format description above
+    sections['document_offsets'].extend([len(sections['tokens']) // _TOKEN_COLUMNS,
+                                         len(sections['mentions']) // _MENTION_COLUMNS,
+                                         len(sections['entities']),
+                                         len(sections['relations']) // _RELATION_COLUMNS])
+    sections['mentions'].extend([-1, len(sections['mention_tokens'])])
+    sections['entities'].append(len(sections['entity_mentions']))
+
+    section_data = [bytes(strings)] + [sections[name].tobytes() for name in _SECTIONS[1:]]
+
+    offset = _aligned(_HEADER_STRUCT.size + _SECTION_STRUCT.size * len(_SECTIONS))
+    section_table = []
+    for data in section_data:
+        section_table.append((offset, len(data)))
+        offset = _aligned(offset + len(data))
+
+    with open(corpus_path, 'wb') as f:
+        f.write(_HEADER_STRUCT.pack(CORPUS_MAGIC, CORPUS_FORMAT_VERSION, _BYTE_ORDER_MARK))
+        for section_offset, section_length in section_table:
+            f.write(_SECTION_STRUCT.pack(section_offset, section_length))
+        for data, (section_offset, _) in zip(section_data, section_table):
+            f.write(b'\x00' * (section_offset - f.tell()))
+            f.write(data)
+
+    return num_documents
+
+
+class CorpusReader(typing.Sequence[model.Document]):
+    """
+    Read-only view on a binary corpus file. The file is memory-mapped, so opening it is
+    independent of its size, and processes reading the same corpus share its pages.
+    Documents are only materialized when accessed, each access returns a new Document.
+    """
+
+    def __init__(self, corpus_path: str):
+        self._path = corpus_path
+        with open(corpus_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, byte_order_mark = _HEADER_STRUCT.unpack_from(self._mmap, 0)
+        if magic != CORPUS_MAGIC:
+            raise ValueError(f'{corpus_path} is not a corpus file.')
+        if version != CORPUS_FORMAT_VERSION:
+            raise ValueError(f'Corpus {corpus_path} has format version {version}, '
+                             f'but only version {CORPUS_FORMAT_VERSION} is supported.')
+        if byte_order_mark != _BYTE_ORDER_MARK:
+            raise ValueError(f'Corpus {corpus_path} was written on a machine with different byte order.')
+
+        self._buffer = memoryview(self._mmap)
+        self._sections: typing.Dict[str, memoryview] = {}
+        for i, name in enumerate(_SECTIONS):
+            offset, length = _SECTION_STRUCT.unpack_from(self._mmap, _HEADER_STRUCT.size + i * _SECTION_STRUCT.size)
+            section = self._buffer[offset:offset + length]
+            self._sections[name] = section if name == 'strings' else section.cast('i')
+
+        self._strings: typing.List[typing.Optional[str]] = [None] * (len(self._sections['string_offsets']) - 1)
+
+    def close(self) -> None:
+        for section in self._sections.values():
+            section.release()
+        self._sections = {}
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self) -> 'CorpusReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self._sections['documents']) // _DOCUMENT_COLUMNS
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'Corpus {self._path} has no document {index}.')
+        return self._read_document(index)
+
+    def __iter__(self) -> typing.Iterator[model.Document]:
+        for i in range(len(self)):
+            yield self._read_document(i)
+
+    def _string(self, string_id: int) -> str:
+        value = self._strings[string_id]
+        if value is None:
+            offsets = self._sections['string_offsets']
+            value = sys.intern(bytes(self._sections['strings'][offsets[string_id]:offsets[string_id + 1]]).decode('utf8'))
+            self._strings[string_id] = value
+        return value
+
+    def _read_document(self, index: int) -> model.Document:
+        documents = self._sections['documents']
+        document_offsets = self._sections['document_offsets']
+        doc_id, category, text, name = documents[index * _DOCUMENT_COLUMNS:(index + 1) * _DOCUMENT_COLUMNS]
+        token_start, mention_start, entity_start, relation_start = \
+            document_offsets[index * 4:(index + 1) * 4]
+        token_end, mention_end, entity_end, relation_end = document_offsets[(index + 1) * 4:(index + 2) * 4]
+
+        token_columns = self._sections['tokens'][token_start * _TOKEN_COLUMNS:token_end * _TOKEN_COLUMNS]
+        tokens = [
+            model.Token(text=self._string(token_columns[i]),
+                        pos_tag=self._string(token_columns[i + 1]),
+                        sentence_index=token_columns[i + 2],
+                        index_in_document=i // _TOKEN_COLUMNS)
+            for i in range(0, len(token_columns), _TOKEN_COLUMNS)
+        ]
+
+        mention_columns = self._sections['mentions'][mention_start * _MENTION_COLUMNS:
+                                                     (mention_end + 1) * _MENTION_COLUMNS]
+        mention_tokens = self._sections['mention_tokens']
+        mentions = [
+            model.Mention(ner_tag=self._string(mention_columns[i]),
+                          token_document_indices=mention_tokens[mention_columns[i + 1]:
+                                                                mention_columns[i + 1 + _MENTION_COLUMNS]].tolist())
+            for i in range(0, len(mention_columns) - _MENTION_COLUMNS, _MENTION_COLUMNS)
+        ]
+
+        entity_starts = self._sections['entities'][entity_start:entity_end + 1]
+        entity_mentions = self._sections['entity_mentions']
+        entities = [
+            model.Entity(mention_indices=entity_mentions[start:end].tolist())
+            for start, end in zip(entity_starts, entity_starts[1:])
+        ]
+
+        relation_columns = self._sections['relations'][relation_start * _RELATION_COLUMNS:
+                                                       relation_end * _RELATION_COLUMNS]
+        relations = [
+            model.Relation(head_mention_index=relation_columns[i],
+                           tail_mention_index=relation_columns[i + 1],
+                           tag=self._string(relation_columns[i + 2]))
+            for i in range(0, len(relation_columns), _RELATION_COLUMNS)
+        ]
+
+        return model.Document(id=self._string(doc_id), category=self._string(category),
+                              text=self._string(text), name=self._string(name),
+                              tokens=tokens, mentions=mentions, entities=entities, relations=relations)
+
+
+def convert_json_file_to_corpus(json_path: str, corpus_path: str) -> int:
+    from data import loader
+    return write_corpus(loader.read_documents_from_json_file(json_path), corpus_path)
+
+
+def load_corpus(json_path: str) -> CorpusReader:
+    """
+    Opens the binary corpus for a json lines file, converting it first
+    if there is no corpus file next to it yet, or if it is out of date.
+    """
+    corpus_path = f'{json_path}.corpus'
+    if not os.path.isfile(corpus_path) or os.path.getmtime(corpus_path) < os.path.getmtime(json_path):
+        # written under a temporary name first, processes sharing the corpus never map partial files
+        temporary_path = f'{corpus_path}.{os.getpid()}.tmp'
+        convert_json_file_to_corpus(json_path, temporary_path)
+        os.replace(temporary_path, corpus_path)
+    return CorpusReader(corpus_path)
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Converts a json lines document file into a binary corpus.')
+    parser.add_argument('json_path')
+    parser.add_argument('corpus_path')
+    args = parser.parse_args()
+    num_documents = convert_json_file_to_corpus(args.json_path, args.corpus_path)
+    print(f'Wrote {num_documents} documents to {args.corpus_path}')
+
+
+if __name__ == '__main__':
+    main()
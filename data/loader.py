@@ -1,16 +1,14 @@
+import collections
+import functools
+import gzip
 import json
 import os
+import sys
 import typing
-
-import nltk
+from concurrent import futures
 
 from data import model
 
-try:
-    nltk.data.find("averaged_perceptron_tagger")
-except LookupError:
-    nltk.download("averaged_perceptron_tagger")
-
 
 def read_names(filename) -> typing.List[typing.List[str]]:
     data = open(filename).readlines()
@@ -19,29 +17,84 @@ def read_names(filename) -> typing.List[typing.List[str]]:
 
 
 def read_documents_from_json_file(file_path: str) -> typing.List[model.Document]:
-    documents = []
-    with open(file_path, "r", encoding="utf8") as f:
-        for json_line in f:
-            json_data = json.loads(json_line)
-            documents.append(read_document_from_json(json_data))
-
-    return documents
+    return list(iter_documents_from_json_file(file_path))
 
 
 def read_documents_from_folder(folder_path: str) -> typing.List[model.Document]:
-    documents = []
-    print(f"reading from {folder_path}")
-    for file_name in os.listdir(folder_path):
-        print(file_name)
-        if not os.path.isfile(os.path.join(folder_path, file_name)):
-            continue
-        file_path = os.path.join(folder_path, file_name)
-        read_documents = read_documents_from_json_file(file_path)
-        print(len(read_documents))
-        documents.extend(read_documents)
+    documents = list(iter_documents_from_folder(folder_path))
+    print(f"read {len(documents)} documents from {folder_path}")
     return documents
 
 
+def iter_documents_from_json_file(
+    file_path: str,
+    ids: typing.Optional[typing.Collection[str]] = None,
+    categories: typing.Optional[typing.Collection[str]] = None,
+) -> typing.Iterator[model.Document]:
+    """
+    Lazily reads the documents in a json lines file, one line at a time.
+
+    :param ids: only read documents with one of these ids, all if None
+    :param categories: only read documents of one of these categories, all if None
+    """
+    with _open_json_file(file_path) as f:
+        for json_line in f:
+            json_data = json.loads(json_line)
+            if ids is not None and json_data["id"] not in ids:
+                continue
+            if categories is not None and json_data["category"] not in categories:
+                continue
+            yield read_document_from_json(json_data)
+
+
+def _open_json_file(file_path: str) -> typing.TextIO:
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rt", encoding="utf8")
+    return open(file_path, "r", encoding="utf8")
+
+
+def iter_documents_from_folder(
+    folder_path: str,
+    ids: typing.Optional[typing.Collection[str]] = None,
+    categories: typing.Optional[typing.Collection[str]] = None,
+    num_workers: int = 1,
+) -> typing.Iterator[model.Document]:
+    """
+    Lazily reads the documents of all json lines files in a folder, file by file.
+
+    :param num_workers: number of processes parsing files in parallel, documents are still
+                        yielded in file order and at most two files per worker are held in memory
+    """
+    file_paths = [
+        os.path.join(folder_path, file_name)
+        for file_name in os.listdir(folder_path)
+        if os.path.isfile(os.path.join(folder_path, file_name))
+    ]
+
+    if num_workers <= 1:
+        for file_path in file_paths:
+            yield from iter_documents_from_json_file(file_path, ids, categories)
+        return
+
+    read_file = functools.partial(_read_filtered_documents_from_json_file, ids=ids, categories=categories)
+    with futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending: typing.Deque[futures.Future] = collections.deque()
+        for file_path in file_paths:
+            pending.append(executor.submit(read_file, file_path))
+            if len(pending) >= 2 * num_workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def _read_filtered_documents_from_json_file(
+    file_path: str,
+    ids: typing.Optional[typing.Collection[str]],
+    categories: typing.Optional[typing.Collection[str]],
+) -> typing.List[model.Document]:
+    return list(iter_documents_from_json_file(file_path, ids, categories))
+
+
 def read_document_from_json(json_data: typing.Dict) -> model.Document:
     mentions = _read_mentions_from_json(json_data["mentions"])
     entities = _read_entities_from_json(json_data["entities"])
@@ -66,8 +119,9 @@ def _read_tokens_from_json(
     for i, json_token in enumerate(json_tokens):
         tokens.append(
             model.Token(
-                text=json_token["text"],
-                pos_tag=json_token["posTag"],
+                # token texts and tags repeat a lot, share one string object for each
+                text=sys.intern(json_token["text"]),
+                pos_tag=sys.intern(json_token["posTag"]),
                 index_in_document=i,
                 sentence_index=json_token["sentenceIndex"],
             )
@@ -97,7 +151,7 @@ def _read_entities_from_json(
 
 def _read_mention_from_json(json_mention: typing.Dict) -> model.Mention:
     return model.Mention(
-        ner_tag=json_mention["type"],
+        ner_tag=sys.intern(json_mention["type"]),
         token_document_indices=json_mention["tokenDocumentIndices"],
     )
 
@@ -118,7 +172,7 @@ def _read_relations_from_json(
             model.Relation(
                 head_mention_index=head_mention_index,
                 tail_mention_index=tail_mention_index,
-                tag=json_relation["type"],
+                tag=sys.intern(json_relation["type"]),
             )
         )
 
@@ -2,6 +2,89 @@ import dataclasses
 
 import typing
 
+from data import vocabulary
+
+
+def _slotted(cls):
+    """
+    Recreates the given dataclass with __slots__ for all of its fields, so instances do not
+    carry a per-instance __dict__. dataclasses.dataclass(slots=True) does the same, but
+    needs Python 3.10.
+    """
+    field_names = tuple(f.name for f in dataclasses.fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = field_names
+    for field_name in field_names:
+        # default values are kept by the generated __init__, the class attributes would
+        # conflict with the slot descriptors
+        cls_dict.pop(field_name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    slotted_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted_cls.__qualname__ = cls.__qualname__
+    return slotted_cls
+
+
+@dataclasses.dataclass
+class _LayerIndex:
+    """
+    Lookup structure derived from one or more annotation layers (lists) of a document.
+    It is valid as long as the document still holds the very same lists at the same lengths,
+    i.e. layers are expected to be either appended to, or replaced as a whole.
+    """
+    layers: typing.Tuple[typing.List, ...]
+    sizes: typing.Tuple[int, ...]
+    payload: typing.Any
+
+    def is_valid_for(self, layers: typing.Tuple[typing.List, ...]) -> bool:
+        if any(own is not other for own, other in zip(self.layers, layers)):
+            return False
+        return self.sizes == tuple(len(layer) for layer in layers)
+
+    def is_extendable_to(self, layers: typing.Tuple[typing.List, ...]) -> bool:
+        """
+        True if only elements were appended to the first layer since the index was built.
+        """
+        if any(own is not other for own, other in zip(self.layers, layers)):
+            return False
+        if self.sizes[1:] != tuple(len(layer) for layer in layers[1:]):
+            return False
+        return self.sizes[0] <= len(layers[0])
+
+
+@dataclasses.dataclass
+class _SentenceIndex:
+    # offsets[i] is the document index of the first token in sentence i,
+    # offsets[-1] is the number of tokens in the document
+    offsets: typing.List[int]
+    sentences: typing.List[typing.List["Token"]]
+    # token_sentences[i] is the index of the sentence containing token i
+    token_sentences: typing.List[int]
+
+
+@dataclasses.dataclass
+class _RelationIndex:
+    pairs: typing.Set[typing.Tuple[int, int]] = dataclasses.field(default_factory=set)
+    # mention index -> relation tag id -> indices of relations with the mention as head (tail)
+    outgoing: typing.Dict[int, typing.Dict[int, typing.List[int]]] = dataclasses.field(
+        default_factory=dict
+    )
+    incoming: typing.Dict[int, typing.Dict[int, typing.List[int]]] = dataclasses.field(
+        default_factory=dict
+    )
+
+
+@dataclasses.dataclass
+class _KeyIndex:
+    # canonical key (to_tuple) of each element in a layer
+    keys: typing.List[typing.Tuple] = dataclasses.field(default_factory=list)
+    # canonical key -> position of the first element with that key
+    positions: typing.Dict[typing.Tuple, int] = dataclasses.field(default_factory=dict)
+
+    def add(self, key: typing.Tuple) -> None:
+        self.positions.setdefault(key, len(self.keys))
+        self.keys.append(key)
+
 
 @dataclasses.dataclass
 class Document:
@@ -13,63 +96,228 @@ class Document:
     mentions: typing.List["Mention"] = dataclasses.field(default_factory=list)
     entities: typing.List["Entity"] = dataclasses.field(default_factory=list)
     relations: typing.List["Relation"] = dataclasses.field(default_factory=list)
+    _indices: typing.Dict[str, _LayerIndex] = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
 
-    @property
-    def sentences(self) -> typing.List[typing.List["Token"]]:
-        ret = []
+    def _get_index(
+        self,
+        name: str,
+        layers: typing.Tuple[typing.List, ...],
+        build: typing.Callable[[], typing.Any],
+        extend: typing.Optional[typing.Callable[[typing.Any, int], None]] = None,
+    ) -> typing.Any:
+        """
+        Returns the index with the given name, (re-)building it if its layers changed.
+
+        :param extend: optional callback that updates an existing index in place with the
+                       elements appended to the first layer, starting from the given position
+        """
+        index = self._indices.get(name)
+        if index is not None and index.is_valid_for(layers):
+            return index.payload
+        if index is not None and extend is not None and index.is_extendable_to(layers):
+            extend(index.payload, index.sizes[0])
+            index.sizes = tuple(len(layer) for layer in layers)
+            return index.payload
+        index = _LayerIndex(
+            layers=layers,
+            sizes=tuple(len(layer) for layer in layers),
+            payload=build(),
+        )
+        self._indices[name] = index
+        return index.payload
+
+    def _sentence_index(self) -> _SentenceIndex:
+        return self._get_index("sentences", (self.tokens,), self._build_sentence_index)
+
+    def _build_sentence_index(self) -> _SentenceIndex:
+        offsets = []
+        token_sentences = []
         last_sentence_id: typing.Optional[int] = None
-        for token in self.tokens:
+        for i, token in enumerate(self.tokens):
             if token.sentence_index != last_sentence_id:
                 last_sentence_id = token.sentence_index
-                ret.append([])
-            ret[-1].append(token)
-        return ret
+                offsets.append(i)
+            token_sentences.append(len(offsets) - 1)
+        offsets.append(len(self.tokens))
+        sentences = [self.tokens[start:end] for start, end in zip(offsets, offsets[1:])]
+        return _SentenceIndex(
+            offsets=offsets, sentences=sentences, token_sentences=token_sentences
+        )
+
+    @property
+    def sentences(self) -> typing.List[typing.List["Token"]]:
+        """
+        Tokens grouped by sentence. Computed once and cached until the tokens change,
+        so the returned lists must not be modified.
+        """
+        return self._sentence_index().sentences
+
+    @property
+    def sentence_offsets(self) -> typing.List[int]:
+        """
+        Document level index of the first token of each sentence, followed by the number of tokens.
+        """
+        return self._sentence_index().offsets
+
+    def token_index_in_sentence(self, token_index: int) -> int:
+        """
+        Position of the token with the given document level index inside its sentence.
+        """
+        sentence_index = self._sentence_index()
+        return token_index - sentence_index.offsets[sentence_index.token_sentences[token_index]]
+
+    def _relation_index(self) -> _RelationIndex:
+        return self._get_index(
+            "relations",
+            (self.relations,),
+            build=lambda: self._add_relations(_RelationIndex(), 0),
+            extend=self._add_relations,
+        )
+
+    def _add_relations(
+        self, relation_index: _RelationIndex, start: int
+    ) -> _RelationIndex:
+        for i in range(start, len(self.relations)):
+            relation = self.relations[i]
+            head = relation.head_mention_index
+            tail = relation.tail_mention_index
+            relation_index.pairs.add((head, tail))
+            relation_index.outgoing.setdefault(head, {}).setdefault(relation.tag_id, []).append(i)
+            relation_index.incoming.setdefault(tail, {}).setdefault(relation.tag_id, []).append(i)
+        return relation_index
 
     def relation_exists_between(
         self, head_mention_index: int, tail_mention_index: int
     ) -> bool:
-        for r in self.relations:
-            if (
-                r.head_mention_index == head_mention_index
-                and r.tail_mention_index == tail_mention_index
-            ):
-                return True
-        return False
+        return (head_mention_index, tail_mention_index) in self._relation_index().pairs
 
-    def get_relations_by_mention(
+    def _relation_indices_by_tag(
         self, mention_index: int, only_head=False, only_tail=False
-    ) -> typing.List["Relation"]:
+    ) -> typing.List[typing.Dict[int, typing.List[int]]]:
         if only_tail and only_head:
             raise ValueError(
                 "The mention can not be only head and tail at the same time!"
             )
-
+        relation_index = self._relation_index()
         ret = []
-        for relation in self.relations:
-            is_head = relation.head_mention_index == mention_index
-            if only_head and is_head:
-                ret.append(relation)
-                continue
-
-            is_tail = relation.tail_mention_index == mention_index
-            if only_tail and is_tail:
-                ret.append(relation)
-                continue
-
-            if is_tail or is_head:
-                ret.append(relation)
+        if not only_tail:
+            ret.append(relation_index.outgoing.get(mention_index, {}))
+        if not only_head:
+            ret.append(relation_index.incoming.get(mention_index, {}))
         return ret
 
+    def get_relations_by_mention(
+        self, mention_index: int, only_head=False, only_tail=False
+    ) -> typing.List["Relation"]:
+        """
+        Relations the mention takes part in, in document order.
+
+        :param only_head: only relations with the mention as head
+        :param only_tail: only relations with the mention as tail
+        """
+        relation_indices = set()
+        for by_tag in self._relation_indices_by_tag(mention_index, only_head, only_tail):
+            for indices in by_tag.values():
+                relation_indices.update(indices)
+        return [self.relations[i] for i in sorted(relation_indices)]
+
+    def _mention_keys(self) -> _KeyIndex:
+        return self._get_index(
+            "mention_keys",
+            (self.mentions,),
+            build=lambda: self._add_mention_keys(_KeyIndex(), 0),
+            extend=self._add_mention_keys,
+        )
+
+    def _add_mention_keys(self, key_index: _KeyIndex, start: int) -> _KeyIndex:
+        for i in range(start, len(self.mentions)):
+            key_index.add(self.mentions[i].to_tuple(self))
+        return key_index
+
+    def _entity_keys(self) -> _KeyIndex:
+        return self._get_index(
+            "entity_keys",
+            (self.entities, self.mentions),
+            build=lambda: self._add_entity_keys(_KeyIndex(), 0),
+            extend=self._add_entity_keys,
+        )
+
+    def _add_entity_keys(self, key_index: _KeyIndex, start: int) -> _KeyIndex:
+        for i in range(start, len(self.entities)):
+            key_index.add(self._entity_key(self.entities[i]))
+        return key_index
+
+    def _entity_key(self, entity: "Entity") -> typing.Tuple:
+        # same as Entity.to_tuple, but reusing the cached mention keys
+        mention_keys = self._mention_keys().keys
+        return (frozenset([mention_keys[i] for i in entity.mention_indices]),)
+
+    def _relation_keys(self) -> _KeyIndex:
+        return self._get_index(
+            "relation_keys",
+            (self.relations, self.entities, self.mentions),
+            build=lambda: self._add_relation_keys(_KeyIndex(), 0),
+            extend=self._add_relation_keys,
+        )
+
+    def _add_relation_keys(self, key_index: _KeyIndex, start: int) -> _KeyIndex:
+        for i in range(start, len(self.relations)):
+            key_index.add(self._relation_key(self.relations[i]))
+        return key_index
+
+    def _relation_key(self, relation: "Relation") -> typing.Tuple:
+        # same as Relation.to_tuple, but reusing the cached entity keys
+        entity_keys = self._entity_keys().keys
+        return (
+            relation.canonical_tag,
+            entity_keys[relation.head_mention_index],
+            entity_keys[relation.tail_mention_index],
+        )
+
+    def canonical_keys(self, attribute: str) -> typing.List[typing.Tuple]:
+        """
+        The canonical keys (see to_tuple) of all elements in the given layer, in order.
+        Computed once per element and cached, the returned list must not be modified.
+
+        :param attribute: one of "mentions", "entities", "relations"
+        """
+        if attribute == "mentions":
+            return self._mention_keys().keys
+        if attribute == "entities":
+            return self._entity_keys().keys
+        if attribute == "relations":
+            return self._relation_keys().keys
+        raise ValueError(f'Unknown document attribute "{attribute}"')
+
     def contains_relation(self, relation: "Relation") -> bool:
-        return relation.to_tuple(self) in [e.to_tuple(self) for e in self.relations]
+        return self._relation_key(relation) in self._relation_keys().positions
 
     def contains_entity(self, entity: "Entity") -> bool:
-        return entity.to_tuple(self) in [e.to_tuple(self) for e in self.entities]
+        return self._entity_key(entity) in self._entity_keys().positions
+
+    def _mention_entity_index(self) -> typing.Dict[int, int]:
+        return self._get_index(
+            "mention_entities",
+            (self.entities,),
+            build=lambda: self._add_mention_entities({}, 0),
+            extend=self._add_mention_entities,
+        )
+
+    def _add_mention_entities(
+        self, mention_entities: typing.Dict[int, int], start: int
+    ) -> typing.Dict[int, int]:
+        for entity_index in range(start, len(self.entities)):
+            for mention_index in self.entities[entity_index].mention_indices:
+                # first entity wins, if a mention is (wrongly) part of multiple ones
+                mention_entities.setdefault(mention_index, entity_index)
+        return mention_entities
 
     def entity_index_for_mention_index(self, mention_index: int) -> int:
-        for i, e in enumerate(self.entities):
-            if mention_index in e.mention_indices:
-                return i
+        entity_index = self._mention_entity_index().get(mention_index)
+        if entity_index is not None:
+            return entity_index
         print(mention_index)
         print(self.entities)
         mention = self.mentions[mention_index]
@@ -79,22 +327,52 @@ class Document:
             f"if entities are not properly resolved"
         )
 
+    def entity_indices_for_mentions(self) -> typing.List[typing.Optional[int]]:
+        """
+        Index of the entity each mention is part of, None for mentions without entity.
+        """
+        mention_entities = self._mention_entity_index()
+        return [mention_entities.get(i) for i in range(len(self.mentions))]
+
     def mention_index(self, mention: "Mention") -> int:
-        mentions_as_tuples = [m.to_tuple(self) for m in self.mentions]
-        mention_index = mentions_as_tuples.index(mention.to_tuple(self))
+        mention_index = self._mention_keys().positions.get(mention.to_tuple(self))
+        if mention_index is None:
+            raise ValueError(f"Document contains no mention {mention}")
         return mention_index
 
     def entity_index_for_mention(self, mention: "Mention") -> int:
         mention_index = self.mention_index(mention)
         return self.entity_index_for_mention_index(mention_index)
 
+    def _token_mentions(self) -> typing.List[typing.List[int]]:
+        return self._get_index(
+            "token_mentions",
+            (self.mentions, self.tokens),
+            build=lambda: self._add_token_mentions([[] for _ in self.tokens], 0),
+            extend=self._add_token_mentions,
+        )
+
+    def _add_token_mentions(
+        self, token_mentions: typing.List[typing.List[int]], start: int
+    ) -> typing.List[typing.List[int]]:
+        for mention_index in range(start, len(self.mentions)):
+            for token_index in self.mentions[mention_index].token_document_indices:
+                if 0 <= token_index < len(token_mentions):
+                    token_mentions[token_index].append(mention_index)
+        return token_mentions
+
+    def mention_indices_for_token_index(self, token_index: int) -> typing.List[int]:
+        """
+        Indices of all mentions covering the token with the given document level index,
+        in ascending order. The returned list must not be modified.
+        """
+        return self._token_mentions()[token_index]
+
     def get_mentions_for_token(self, token: "Token") -> typing.List["Mention"]:
-        matched = []
-        for mention in self.mentions:
-            index_in_document = token.index_in_document
-            if index_in_document in mention.token_document_indices:
-                matched.append(mention)
-        return matched
+        return [
+            self.mentions[i]
+            for i in self.mention_indices_for_token_index(token.index_in_document)
+        ]
 
     def sentence_index_for_token_index(self, token_index: int) -> int:
         assert 0 <= token_index < len(self.tokens)
@@ -105,17 +383,43 @@ class Document:
         clear_mentions: bool = False,
         clear_relations: bool = False,
         clear_entities: bool = False,
+        share_annotations: bool = False,
     ) -> "Document":
-        return Document(
+        """
+        Tokens are never modified by any pipeline step, so the copy shares the token list
+        (and the indices derived from it) with this document.
+
+        :param share_annotations: let the copy reference the same mention, entity and relation
+                                  objects as this document, instead of copying each of them.
+                                  The layer lists themselves are still separate, so elements can
+                                  be added, removed or replaced, but must not be modified in place.
+        """
+
+        def copy_layer(layer: typing.List, clear: bool) -> typing.List:
+            if clear:
+                return []
+            if share_annotations:
+                return list(layer)
+            return [e.copy() for e in layer]
+
+        copied = Document(
             name=self.name,
             text=self.text,
             id=self.id,
             category=self.category,
-            tokens=[t.copy() for t in self.tokens],
-            mentions=[] if clear_mentions else [m.copy() for m in self.mentions],
-            relations=[] if clear_relations else [r.copy() for r in self.relations],
-            entities=[] if clear_entities else [e.copy() for e in self.entities],
+            tokens=self.tokens,
+            mentions=copy_layer(self.mentions, clear_mentions),
+            relations=copy_layer(self.relations, clear_relations),
+            entities=copy_layer(self.entities, clear_entities),
+        )
+        copied._indices.update(
+            {
+                name: index
+                for name, index in self._indices.items()
+                if all(layer is self.tokens for layer in index.layers)
+            }
         )
+        return copied
 
     def to_json_serializable(self):
         return {
@@ -130,10 +434,24 @@ class Document:
         }
 
 
+@_slotted
 @dataclasses.dataclass
 class Mention:
     ner_tag: str
     token_document_indices: typing.List[int] = dataclasses.field(default_factory=list)
+    # id of ner_tag in data.vocabulary.NER_TAGS, equal for tags that only differ in case
+    ner_tag_id: int = dataclasses.field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.ner_tag_id = vocabulary.NER_TAGS.id(self.ner_tag)
+
+    def __reduce__(self):
+        # tag ids are process local, let the receiving process intern the tag again
+        return Mention, (self.ner_tag, self.token_document_indices)
+
+    @property
+    def canonical_ner_tag(self) -> str:
+        return vocabulary.NER_TAGS.canonical(self.ner_tag_id)
 
     def get_sentence_index(self, doc: Document) -> int:
         unique_sentence_indices = set(
@@ -146,7 +464,7 @@ class Mention:
         return [document.tokens[i] for i in self.token_document_indices]
 
     def to_tuple(self, *args) -> typing.Tuple:
-        return (self.ner_tag.lower(),) + tuple(self.token_document_indices)
+        return (self.canonical_ner_tag,) + tuple(self.token_document_indices)
 
     def text(self, document: Document):
         return " ".join([t.text for t in self.get_tokens(document)])
@@ -174,6 +492,7 @@ class Mention:
         }
 
 
+@_slotted
 @dataclasses.dataclass
 class Entity:
     mention_indices: typing.List[int] = dataclasses.field(default_factory=list)
@@ -198,11 +517,25 @@ class Entity:
         return {"mentionIndices": self.mention_indices}
 
 
+@_slotted
 @dataclasses.dataclass
 class Relation:
     head_mention_index: int
     tail_mention_index: int
     tag: str
+    # id of tag in data.vocabulary.RELATION_TAGS, equal for tags that only differ in case
+    tag_id: int = dataclasses.field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.tag_id = vocabulary.RELATION_TAGS.id(self.tag)
+
+    def __reduce__(self):
+        # tag ids are process local, let the receiving process intern the tag again
+        return Relation, (self.head_mention_index, self.tail_mention_index, self.tag)
+
+    @property
+    def canonical_tag(self) -> str:
+        return vocabulary.RELATION_TAGS.canonical(self.tag_id)
 
     def copy(self) -> "Relation":
         return Relation(
@@ -213,7 +546,7 @@ class Relation:
 
     def to_tuple(self, document: Document) -> typing.Tuple:
         return (
-            self.tag.lower(),
+            self.canonical_tag,
             document.entities[self.head_mention_index].to_tuple(document),
             document.entities[self.tail_mention_index].to_tuple(document),
         )
@@ -236,6 +569,7 @@ class Relation:
         }
 
 
+@_slotted
 @dataclasses.dataclass
 class Token:
     text: str
@@ -244,15 +578,12 @@ class Token:
     sentence_index: int
 
     def index_in_sentence(self, doc: "Document") -> int:
-        index_in_sentence = 0
-        for token_index, token in enumerate(doc.tokens):
-            if token == self:
-                return index_in_sentence
-            if token.sentence_index == self.sentence_index:
-                index_in_sentence += 1
-        raise IndexError(
-            f"Could not find token in sentence with id {self.sentence_index}."
-        )
+        token_index = self.index_in_document
+        if not 0 <= token_index < len(doc.tokens) or doc.tokens[token_index] != self:
+            raise IndexError(
+                f"Could not find token in sentence with id {self.sentence_index}."
+            )
+        return doc.token_index_in_sentence(token_index)
 
     def copy(self) -> "Token":
         return Token(
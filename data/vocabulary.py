@@ -0,0 +1,43 @@
+import sys
+import typing
+
+
+class TagVocabulary:
+    """
+    Interns tags to small integer ids. Spellings of a tag that only differ in case
+    (e.g. "Activity Data" and "activity data") share one id, which maps back to
+    the canonical, lower cased form of the tag.
+    """
+
+    def __init__(self):
+        # any spelling seen so far -> id
+        self._ids: typing.Dict[str, int] = {}
+        # id -> canonical (lower case) tag
+        self._canonical: typing.List[str] = []
+
+    def id(self, tag: str) -> int:
+        tag_id = self._ids.get(tag)
+        if tag_id is None:
+            canonical = tag.lower()
+            tag_id = self._ids.get(canonical)
+            if tag_id is None:
+                tag_id = len(self._canonical)
+                self._canonical.append(sys.intern(canonical))
+                self._ids[self._canonical[tag_id]] = tag_id
+            self._ids[tag] = tag_id
+        return tag_id
+
+    def ids(self, tags: typing.Iterable[str]) -> typing.FrozenSet[int]:
+        return frozenset(self.id(t) for t in tags)
+
+    def canonical(self, tag_id: int) -> str:
+        return self._canonical[tag_id]
+
+    def __len__(self) -> int:
+        return len(self._canonical)
+
+
+# Ids are only valid within one process, they are not persisted
+# and are re-interned when documents are unpickled.
+NER_TAGS = TagVocabulary()
+RELATION_TAGS = TagVocabulary()
@@ -1,47 +1,62 @@
+import gzip
+import io
 import json
+import typing
 
 from data import model
 
 
 def dump_document_to_json(document: model.Document) -> str:
-    as_dict = {
-        "id": document.name,
-        "text": document.text,
-        "tokens": [
-            {
-                "text": t.text,
-                "stanza_pos": t.pos_tag,
-                "ner": t.bio_tag,
-                "sentence_id": t.sentence_index,
-            }
-            for t in document.tokens
-        ],
-        "mentions": [
-            {
-                "ner": m.ner_tag,
-                "sentence_id": m.sentence_index,
-                "token_indices": m.token_indices,
-            }
-            for m in document.mentions
-        ],
-        "entities": [{"mention_indices": e.mention_indices} for e in document.entities],
-        "relations": [
-            {
-                "head_entity": {
-                    "mention_indices": document.entities[
-                        r.head_entity_index
-                    ].mention_indices
-                },
-                "tail_entity": {
-                    "mention_indices": document.entities[
-                        r.tail_entity_index
-                    ].mention_indices
-                },
-                "type": r.tag,
-                "evidence": r.evidence,
-            }
-            for r in document.relations
-        ],
-    }
-
-    return json.dumps(as_dict)
+    """
+    Serializes a document into a single json line, as read by data.loader.read_document_from_json
+    """
+    return json.dumps(document.to_json_serializable())
+
+
+class JsonLinesDocumentWriter:
+    """
+    Writes documents to a json lines file, one document per line, so that memory
+    usage does not depend on the number of documents written.
+
+    :param compress: gzip the output, defaults to compressing files ending in ".gz"
+    :param buffer_size: number of bytes collected before writing to disk
+    """
+
+    def __init__(self, file_path: str, compress: typing.Optional[bool] = None, buffer_size: int = 1 << 20):
+        if compress is None:
+            compress = file_path.endswith('.gz')
+        raw = gzip.open(file_path, 'wb') if compress else open(file_path, 'wb', buffering=0)
+        self._file = io.TextIOWrapper(io.BufferedWriter(raw, buffer_size=buffer_size), encoding='utf8')
+        self._num_written = 0
+
+    @property
+    def num_written(self) -> int:
+        return self._num_written
+
+    def write(self, document: model.Document) -> None:
+        self._file.write(dump_document_to_json(document))
+        self._file.write('\n')
+        self._num_written += 1
+
+    def write_all(self, documents: typing.Iterable[model.Document]) -> None:
+        for document in documents:
+            self.write(document)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'JsonLinesDocumentWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+
+def write_documents_to_json_file(file_path: str, documents: typing.Iterable[model.Document],
+                                 compress: typing.Optional[bool] = None) -> int:
+    """
+    :returns: number of documents written
+    """
+    with JsonLinesDocumentWriter(file_path, compress=compress) as writer:
+        writer.write_all(documents)
+        return writer.num_written
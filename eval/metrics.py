@@ -98,12 +98,12 @@ def entity_f1_stats(*, predicted_documents: typing.List[data.Document],
                     only_tags: typing.List[str],
                     min_num_mentions: int = 1,
                     verbose: bool = False) -> typing.Dict[str, Stats]:
-    predicted_documents = [d.copy() for d in predicted_documents]
+    predicted_documents = [d.copy(share_annotations=True) for d in predicted_documents]
     for d in predicted_documents:
         d.entities = [e for e in d.entities
                       if len(e.mention_indices) >= min_num_mentions and e.get_tag(d) in only_tags]
 
-    ground_truth_documents = [d.copy() for d in ground_truth_documents]
+    ground_truth_documents = [d.copy(share_annotations=True) for d in ground_truth_documents]
     for d in ground_truth_documents:
         d.entities = [e for e in d.entities
                       if len(e.mention_indices) >= min_num_mentions and e.get_tag(d) in only_tags]
@@ -150,17 +150,18 @@ def _f1_stats(*, predicted_documents: typing.List[data.Document],
         true_attribute = getattr(t, attribute)
         pred_attribute = getattr(p, attribute)
 
-        true_as_set = set([e.to_tuple(t) for e in true_attribute])
+        true_as_set = set(t.canonical_keys(attribute))
         assert len(true_as_set) == len(
             true_attribute), f'{len(true_as_set)}, {len(true_attribute)}, {true_as_set}, {true_attribute}'
 
-        pred_as_set = set([e.to_tuple(p) for e in pred_attribute])
+        pred_keys = p.canonical_keys(attribute)
+        pred_as_set = set(pred_keys)
 
         _add_to_stats_by_tag(stats_by_tag, lambda e: _get_ner_tag_for_tuple(attribute, e, t), true_as_set, 'gold')
         _add_to_stats_by_tag(stats_by_tag, lambda e: _get_ner_tag_for_tuple(attribute, e, p), pred_as_set, 'pred')
 
         ok_preds = true_as_set.intersection(pred_as_set)
-        non_ok = [e.pretty_print(p) for e in pred_attribute if e.to_tuple(p) not in true_as_set
+        non_ok = [e.pretty_print(p) for e, key in zip(pred_attribute, pred_keys) if key not in true_as_set
                   # if _get_ner_tag_for_tuple(attribute, e.to_tuple(p), p).lower() == 'actor'
                   ]
         if verbose and len(non_ok) > 0:
@@ -1,5 +1,4 @@
 import dataclasses
-import json
 import os
 import time
 import typing
@@ -43,9 +42,22 @@ class PrintableScores:
         )
 
 
+def read_fold(json_path: str) -> data.CorpusReader:
+    # reads through the binary corpus, which is converted from the json file once, documents
+    # stay in the memory-mapped file until a pipeline run copies the ones of its fold
+    return data.load_corpus(json_path)
+
+
+def read_folds(num_folds: int = 5) -> typing.Tuple[typing.List[data.CorpusReader],
+                                                   typing.List[data.CorpusReader]]:
+    train_folds = [read_fold(f'./jsonl/fold_{i}/train.json') for i in range(num_folds)]
+    test_folds = [read_fold(f'./jsonl/fold_{i}/test.json') for i in range(num_folds)]
+    return train_folds, test_folds
+
+
 def cross_validate_pipeline(p: pipeline.Pipeline, *,
-                            train_folds: typing.List[typing.List[data.Document]],
-                            test_folds: typing.List[typing.List[data.Document]],
+                            train_folds: typing.List[typing.Sequence[data.Document]],
+                            test_folds: typing.List[typing.Sequence[data.Document]],
                             save_results: bool = False,
                             dump_predictions_dir: str = None):
     assert len(train_folds) == len(test_folds)
@@ -53,7 +65,7 @@ def cross_validate_pipeline(p: pipeline.Pipeline, *,
     for n_fold, (train_fold, test_fold) in tqdm.tqdm(enumerate(zip(train_folds, test_folds)),
                                                      total=len(train_folds), desc='cross validation fold'):
         start = time.time_ns()
-        ground_truth = [d.copy() for d in test_fold]
+        ground_truth = [d.copy(share_annotations=True) for d in test_fold]
         print(f'copy of {len(test_fold)} documents took {(time.time_ns() - start) / 1e6:.4f}ms')
 
         pipeline_result = p.run(train_documents=train_fold,
@@ -62,11 +74,10 @@ def cross_validate_pipeline(p: pipeline.Pipeline, *,
         pipeline_results.append(pipeline_result)
     res = accumulate_pipeline_results(pipeline_results)
     if dump_predictions_dir is not None:
+        os.makedirs(dump_predictions_dir, exist_ok=True)
         for i, pipeline_result in enumerate(pipeline_results):
-            json_data = [p.to_json_serializable() for p in pipeline_result.step_results[p.steps[-1]].predictions]
-            os.makedirs(dump_predictions_dir, exist_ok=True)
-            with open(os.path.join(dump_predictions_dir, f'fold-{i}.json'), 'w', encoding='utf8') as f:
-                json.dump(json_data, f)
+            data.write_documents_to_json_file(os.path.join(dump_predictions_dir, f'fold-{i}.jsonl'),
+                                              pipeline_result.step_results[p.steps[-1]].predictions)
 
     if save_results:
         df_persistence = 'experiments.pkl'
@@ -147,8 +158,7 @@ def print_pipeline_results(p: pipeline.Pipeline,
 
 
 def scenario_4_5_6():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     start = time.time()
 
@@ -200,8 +210,7 @@ def scenario_4_5_6():
 
 
 def ablation_studies():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     start = time.time()
 
@@ -358,8 +367,7 @@ def print_scores(scores_by_ner: typing.Dict[str, metrics.Scores],
 
 
 def catboost_debug():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     cross_validate_pipeline(
         p=pipeline.Pipeline(name='complete-cat-boost', steps=[
@@ -384,8 +392,7 @@ def catboost_debug():
 
 
 def neural_rel_debug():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     print('Running pipeline with neural entity resolution, and cat-boost relation extraction')
     cross_validate_pipeline(
@@ -399,8 +406,7 @@ def neural_rel_debug():
 
 
 def coref_debug():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     print('neural entity resolution on perfect mentions')
     cross_validate_pipeline(
@@ -430,8 +436,7 @@ def coref_debug():
 
 
 def scenario_1():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     cross_validate_pipeline(
         p=pipeline.Pipeline(name='mention-extraction-only', steps=[
@@ -444,8 +449,7 @@ def scenario_1():
 
 
 def scenario_2_3():
-    train_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/train.json') for i in range(5)]
-    test_folds = [data.loader.read_documents_from_json(f'./jsonl/fold_{i}/test.json') for i in range(5)]
+    train_folds, test_folds = read_folds()
 
     cross_validate_pipeline(
         p=pipeline.Pipeline(name='naive-coref-perfect-mentions', steps=[
@@ -12,6 +12,13 @@ from mentions import decoder
 class ConditionalRandomFieldsEstimator:
     def __init__(self, model_file_path: pathlib.Path):
         self._model_path = model_file_path
+        self.tagger: typing.Optional[pycrfsuite.Tagger] = None
+        # serialized model the tagger was opened from, if it was loaded from bytes
+        self._model_data: typing.Optional[bytes] = None
+
+    @property
+    def model_path(self) -> pathlib.Path:
+        return self._model_path
 
     @staticmethod
     def load(path: str):
@@ -26,21 +33,46 @@ class ConditionalRandomFieldsEstimator:
         estimator.tagger.open(str(estimator._model_path))
         return estimator
 
-    def train(self, train_documents: typing.List[data.Document]) -> pycrfsuite.Tagger:
-        trainer = pycrfsuite.Trainer(verbose=False)
+    @staticmethod
+    def load_model_from_bytes(model_name: str, model_data: bytes):
+        """
+        Loads a model from its serialized form, e.g. from a pipeline bundle,
+        without touching the model file on disk.
+        """
+        estimator = ConditionalRandomFieldsEstimator(pathlib.Path(f'api/models/crf/{model_name}'))
+        estimator.tagger = pycrfsuite.Tagger()
+        estimator.tagger.open_inmemory(model_data)
+        # the tagger does not copy the model data, nor keep a reference to it
+        estimator._model_data = model_data
+        return estimator
 
+    def train(self, train_documents: typing.List[data.Document]) -> pycrfsuite.Tagger:
+        return self.train_on_sequences(self.training_sequences(train_documents))
+
+    def training_sequences(
+        self, train_documents: typing.List[data.Document]
+    ) -> typing.List[typing.Tuple[typing.List[typing.List[str]], typing.List[str]]]:
+        """
+        Features and labels of every sentence in the given documents, as (xseq, yseq) pairs,
+        which can be kept around to retrain on them later, see train_on_sequences.
+        """
+        sequences = []
         for train_document in train_documents:
             X_train = [self._features_from_tokens(ts) for ts in train_document.sentences]
-            y_train = self._labels_from_tokens(train_document.tokens, train_document.mentions)
+            y_train = self._labels_from_tokens(train_document)
             assert len(X_train) == len(y_train)
             assert all([len(xs) == len(ys) for xs, ys in zip(X_train, y_train)])
 
-            print(X_train)
-            print(y_train)
-            print(list(zip(X_train, y_train)))
+            sequences.extend(zip(X_train, y_train))
+        return sequences
 
-            for xseq, yseq in zip(X_train, y_train):
-                trainer.append(xseq, yseq)
+    def train_on_sequences(
+        self, sequences: typing.List[typing.Tuple[typing.List[typing.List[str]], typing.List[str]]]
+    ) -> pycrfsuite.Tagger:
+        trainer = pycrfsuite.Trainer(verbose=False)
+
+        for xseq, yseq in sequences:
+            trainer.append(xseq, yseq)
 
         trainer.set_params(
             {
@@ -55,14 +87,18 @@ class ConditionalRandomFieldsEstimator:
         os.makedirs(str(self._model_path.parent), exist_ok=True)
         trainer.train(str(self._model_path))
 
-        return self.load(str(self._model_path))
+        self.tagger = self.load(str(self._model_path))
+        return self.tagger
 
     def predict(
         self, test_documents: typing.List[data.Document]
     ) -> typing.List[data.Document]:
+        if self.tagger is None:
+            self.tagger = self.load(str(self._model_path))
+        tagger = self.tagger
+
         predicted_documents = []
         for test_document in test_documents:
-            tagger = self.load(str(self._model_path))
             X_test = [self._features_from_tokens(s) for s in test_document.sentences]
             y_pred = [tagger.tag(xseq) for xseq in X_test]
             predicted = decoder.decode_predictions(test_document, y_pred)
@@ -77,7 +113,7 @@ class ConditionalRandomFieldsEstimator:
         ground_truth_documents = []
 
         for test_document in test_documents:
-            y_test = self._labels_from_tokens(test_document.tokens, test_document.mentions)
+            y_test = self._labels_from_tokens(test_document)
             ground_truth = decoder.decode_predictions(test_document, y_test)
             ground_truth_documents.append(ground_truth)
 
@@ -146,32 +182,23 @@ class ConditionalRandomFieldsEstimator:
         return features
 
     @staticmethod
-    def _labels_from_tokens(
-        tokens: typing.List[data.Token], mentions: typing.List[data.Mention]
-    ) -> typing.List[typing.List[str]]:
+    def _labels_from_tokens(document: data.Document) -> typing.List[typing.List[str]]:
         labels: typing.List[typing.List[str]] = []
-        sentence_id: typing.Optional[int] = None
-        last_mention: typing.Optional[data.Mention] = None
-        for token in tokens:
-            tag: typing.Optional[str] = None
-            first_in_mention = True
-            for mention in mentions:
-                if token.index_in_document in mention.token_document_indices:
-                    tag = mention.ner_tag
-                    if last_mention == mention:
-                        first_in_mention = False
-                    last_mention = mention
-                    break
-            if token.sentence_index != sentence_id:
-                sentence_id = token.sentence_index
-                labels.append([])
-            if tag is None:
-                labels[-1].append("O")
-            else:
-                if first_in_mention:
-                    labels[-1].append(f"B-{tag}")
-                else:
+        last_mention_index: typing.Optional[int] = None
+        for sentence in document.sentences:
+            labels.append([])
+            for token in sentence:
+                mention_indices = document.mention_indices_for_token_index(token.index_in_document)
+                if len(mention_indices) == 0:
+                    labels[-1].append("O")
+                    continue
+                mention_index = mention_indices[0]
+                tag = document.mentions[mention_index].ner_tag
+                if last_mention_index == mention_index:
                     labels[-1].append(f"I-{tag}")
+                else:
+                    labels[-1].append(f"B-{tag}")
+                last_mention_index = mention_index
         return labels
 
     @staticmethod
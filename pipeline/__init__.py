@@ -38,15 +38,15 @@ class Pipeline:
         print(f'Running {self.description()}')
         pipeline_result = PipelineResult({})
 
-        train_documents = [d.copy() for d in train_documents]
-        test_documents = [d.copy() for d in test_documents]
+        train_documents = [d.copy(share_annotations=True) for d in train_documents]
+        test_documents = [d.copy(share_annotations=True) for d in test_documents]
 
         for s in self._steps:
             result = s.run(train_documents=train_documents,
                            test_documents=test_documents,
                            ground_truth_documents=ground_truth_documents)
             pipeline_result.step_results[s] = result
-            test_documents = [d.copy() for d in result.predictions]
+            test_documents = [d.copy(share_annotations=True) for d in result.predictions]
 
         return pipeline_result
 
@@ -0,0 +1,201 @@
+import argparse
+import dataclasses
+import json
+import mmap
+import struct
+import time
+import typing
+
+import mentions
+import relations
+from pipeline.step import CatBoostRelationExtractionStep, CrfMentionEstimatorStep
+
+# A bundle is a single file holding everything needed to restore a trained
+# mention extraction + relation extraction pipeline:
+#
+#   magic (8 bytes) | header length (uint64, little endian) | json header | padding | model blobs
+#
+# The json header (manifest) stores the estimator configs, as well as offset and length
+# of every model blob relative to the start of the file. Blobs are page aligned, so the
+# file can be memory-mapped and sliced without parsing anything but the header.
+BUNDLE_MAGIC = b'PETBNDL\x00'
+BUNDLE_FORMAT_VERSION = 1
+_HEADER_STRUCT = struct.Struct('<8sQ')
+_ALIGNMENT = mmap.ALLOCATIONGRANULARITY
+
+
+@dataclasses.dataclass
+class PipelineBundle:
+    manifest: typing.Dict[str, typing.Any]
+    mention_estimator: mentions.ConditionalRandomFieldsEstimator
+    # None if the bundle was loaded without it, see load_bundle
+    relation_estimator: typing.Optional[relations.CatBoostRelationEstimator]
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    def crf_step(self) -> CrfMentionEstimatorStep:
+        step = CrfMentionEstimatorStep(name=self.manifest['crf']['name'])
+        step.estimator = self.mention_estimator
+        return step
+
+    def catboost_step(self, num_prediction_trees: int = None, thread_count: int = -1) -> CatBoostRelationExtractionStep:
+        step = CatBoostRelationExtractionStep.from_estimator_config(self.manifest['catboost']['config'],
+                                                                    num_prediction_trees=num_prediction_trees,
+                                                                    thread_count=thread_count)
+        step.estimator = self.relation_estimator
+        return step
+
+
+def export_bundle(path: str, *,
+                  crf_step: CrfMentionEstimatorStep,
+                  catboost_step: CatBoostRelationExtractionStep,
+                  version: str) -> typing.Dict[str, typing.Any]:
+    """
+    Packs the trained models of the given steps into a single bundle file at path.
+    Models are read from the locations the steps store them in after training.
+
+    :returns: the manifest written into the bundle
+    """
+    config = catboost_step.estimator_config()
+
+    blobs: typing.List[bytes] = []
+    with open(f'api/models/crf/{crf_step.name}', 'rb') as f:
+        blobs.append(f.read())
+    for pass_id in range(config['num_passes']):
+        with open(relations.CatBoostRelationEstimator.model_path(config['name'], pass_id), 'rb') as f:
+            blobs.append(f.read())
+
+    manifest: typing.Dict[str, typing.Any] = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'crf': {
+            'name': crf_step.name,
+        },
+        'catboost': {
+            'config': config,
+        },
+    }
+    if config.get('candidate_recall') is not None:
+        with open(relations.CatBoostRelationEstimator.candidate_filter_path(config['name']), 'r', encoding='utf8') as f:
+            manifest['catboost']['candidate_filter'] = json.load(f)
+
+    # offsets depend on the header size and the header contains the offsets,
+    # so lay out the blobs behind a header that is generously sized up front
+    header_size = _aligned(_HEADER_STRUCT.size + len(_encode_manifest(manifest)) + 64 * (len(blobs) + 1))
+    offset = header_size
+    blob_locations = []
+    for blob in blobs:
+        blob_locations.append({'offset': offset, 'length': len(blob)})
+        offset = _aligned(offset + len(blob))
+    manifest['crf']['blob'] = blob_locations[0]
+    manifest['catboost']['blobs'] = blob_locations[1:]
+
+    encoded_manifest = _encode_manifest(manifest)
+    assert _HEADER_STRUCT.size + len(encoded_manifest) <= header_size
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER_STRUCT.pack(BUNDLE_MAGIC, len(encoded_manifest)))
+        f.write(encoded_manifest)
+        for blob, location in zip(blobs, blob_locations):
+            f.write(b'\x00' * (location['offset'] - f.tell()))
+            f.write(blob)
+
+    return manifest
+
+
+def read_manifest(path: str) -> typing.Dict[str, typing.Any]:
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _read_manifest(mapped, path)
+
+
+def load_bundle(path: str, load_relation_estimator: bool = True) -> PipelineBundle:
+    """
+    :param load_relation_estimator: also load the cat-boost models, skip them if the
+                                    relation estimator is taken from elsewhere
+    """
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            manifest = _read_manifest(mapped, path)
+
+            crf = manifest['crf']
+            mention_estimator = mentions.ConditionalRandomFieldsEstimator.load_model_from_bytes(
+                crf['name'], _read_blob(mapped, crf['blob'])
+            )
+
+            relation_estimator = None
+            if load_relation_estimator:
+                catboost = manifest['catboost']
+                relation_estimator = relations.CatBoostRelationEstimator.load_model(
+                    catboost['config'], model_blobs=[_read_blob(mapped, b) for b in catboost['blobs']],
+                    candidate_filter=catboost.get('candidate_filter')
+                )
+
+    return PipelineBundle(manifest=manifest,
+                          mention_estimator=mention_estimator,
+                          relation_estimator=relation_estimator)
+
+
+def _read_manifest(mapped: mmap.mmap, path: str) -> typing.Dict[str, typing.Any]:
+    magic, manifest_length = _HEADER_STRUCT.unpack_from(mapped, 0)
+    if magic != BUNDLE_MAGIC:
+        raise ValueError(f'{path} is not a pipeline bundle.')
+    manifest_start = _HEADER_STRUCT.size
+    manifest = json.loads(mapped[manifest_start:manifest_start + manifest_length].decode('utf8'))
+    if manifest['format_version'] != BUNDLE_FORMAT_VERSION:
+        raise ValueError(f'Bundle {path} has format version {manifest["format_version"]}, '
+                         f'but only version {BUNDLE_FORMAT_VERSION} is supported.')
+    return manifest
+
+
+def _read_blob(mapped: mmap.mmap, location: typing.Dict[str, int]) -> bytes:
+    return mapped[location['offset']:location['offset'] + location['length']]
+
+
+def _encode_manifest(manifest: typing.Dict[str, typing.Any]) -> bytes:
+    return json.dumps(manifest).encode('utf8')
+
+
+def _aligned(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Packs a trained pipeline into a single bundle file.')
+    parser.add_argument('output', help='path of the bundle file to write')
+    parser.add_argument('--crf', required=True, help='name of the crf mention extraction model')
+    parser.add_argument('--catboost', required=True, help='name of the cat-boost relation extraction model')
+    parser.add_argument('--version', required=True, help='version label stored in the bundle')
+    parser.add_argument('--num-trees', type=int, default=100)
+    parser.add_argument('--negative-sampling-rate', type=float, default=40.0)
+    parser.add_argument('--context-size', type=int, default=2)
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--num-passes', type=int, default=1)
+    parser.add_argument('--use-pos-features', action='store_true')
+    parser.add_argument('--candidate-recall', type=float, default=None)
+    parser.add_argument('--parse-cache-path', default=None,
+                        help='sqlite file the relation extraction keeps dependency parses in')
+    args = parser.parse_args()
+
+    manifest = export_bundle(
+        args.output,
+        crf_step=CrfMentionEstimatorStep(name=args.crf),
+        catboost_step=CatBoostRelationExtractionStep(name=args.catboost,
+                                                     num_trees=args.num_trees,
+                                                     negative_sampling_rate=args.negative_sampling_rate,
+                                                     context_size=args.context_size,
+                                                     depth=args.depth,
+                                                     num_passes=args.num_passes,
+                                                     use_pos_features=args.use_pos_features,
+                                                     candidate_recall=args.candidate_recall,
+                                                     parse_cache_path=args.parse_cache_path),
+        version=args.version
+    )
+    print(f'Wrote bundle {manifest["version"]} to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
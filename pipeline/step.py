@@ -40,12 +40,12 @@ class PipelineStep(abc.ABC):
             ground_truth_documents: typing.Optional[typing.List[data.Document]] = None,
             training_only: bool = False): 
         if train_documents is not None:
-            train_data = [d.copy() for d in train_documents]
+            train_data = [d.copy(share_annotations=True) for d in train_documents]
         else: 
             train_data = None
 
         if test_documents is not None:
-            test_data = [d.copy() for d in test_documents]
+            test_data = [d.copy(share_annotations=True) for d in test_documents]
         else: 
             test_data = None
 
@@ -91,7 +91,19 @@ class CatBoostRelationExtractionStep(PipelineStep):
                  use_embedding_features: bool = False,
                  verbose: bool = False,
                  class_weighting: float = 0.0,
+                 candidate_recall: float = None,
+                 num_prediction_trees: int = None,
+                 thread_count: int = -1,
+                 feature_cache_dir: str = None,
+                 parse_cache_path: str = None,
                  seed: int = 42):
+        """
+        :param num_prediction_trees: only use this many trees of the trained model for prediction,
+                                     trading accuracy for speed, all trees if not given
+        :param thread_count: number of threads cat-boost uses, -1 uses all cores
+        :param feature_cache_dir: directory to cache training features of documents in
+        :param parse_cache_path: file to additionally keep dependency parses of sentences in
+        """
         super().__init__(name)
         self.estimator = None
         self._num_trees = num_trees
@@ -105,6 +117,11 @@ class CatBoostRelationExtractionStep(PipelineStep):
         self._use_embedding_features = use_embedding_features
         self._learning_rate = learning_rate
         self._class_weighting = class_weighting
+        self._candidate_recall = candidate_recall
+        self._num_prediction_trees = num_prediction_trees
+        self._thread_count = thread_count
+        self._feature_cache_dir = feature_cache_dir
+        self._parse_cache_path = parse_cache_path
 
     def _eval(self, *, predictions: typing.List[data.Document],
               ground_truth: typing.List[data.Document]) -> typing.Dict[str, metrics.Stats]:
@@ -151,30 +168,61 @@ class CatBoostRelationExtractionStep(PipelineStep):
                                                             depth=self._depth,
                                                             learning_rate=self._learning_rate,
                                                             class_weights=class_weights,
+                                                            candidate_recall=self._candidate_recall,
+                                                            thread_count=self._thread_count,
+                                                            feature_cache_dir=self._feature_cache_dir,
+                                                            parse_cache_path=self._parse_cache_path,
                                                             verbose=True)
         self.estimator.train(train_documents)
     
+    def estimator_config(self) -> typing.Dict[str, typing.Any]:
+        """
+        Configuration used to restore a trained estimator, see CatBoostRelationEstimator.load_model
+        """
+        return {
+            "negative_sampling_rate": self._negative_sampling,
+            "num_trees": self._num_trees,
+            "use_pos_features": self._use_pos_features,
+            "use_embedding_features": self._use_embedding_features,
+            "num_passes": self._num_passes,
+            "context_size": self._context_size,
+            "relation_tags": ['Flow', 'Uses', 'Actor Performer', 'Actor Recipient', 'Further Specification', 'Same Gateway'],
+            "ner_tags": ['Activity', 'Actor', 'Activity Data', 'Condition Specification',
+                'Further Specification', 'AND Gateway', 'XOR Gateway'],
+            "name": self._name,
+            "seed": self._seed,
+            "depth": self._depth,
+            "learning_rate": self._learning_rate,
+            "candidate_recall": self._candidate_recall,
+            "parse_cache_path": self._parse_cache_path,
+            "verbose": True
+        }
+
+    @staticmethod
+    def from_estimator_config(config: typing.Dict[str, typing.Any], *,
+                              num_prediction_trees: int = None,
+                              thread_count: int = -1) -> 'CatBoostRelationExtractionStep':
+        return CatBoostRelationExtractionStep(name=config['name'],
+                                              num_trees=config['num_trees'],
+                                              negative_sampling_rate=config['negative_sampling_rate'],
+                                              context_size=config['context_size'],
+                                              depth=config['depth'],
+                                              num_passes=config['num_passes'],
+                                              learning_rate=config['learning_rate'],
+                                              use_pos_features=config['use_pos_features'],
+                                              use_embedding_features=config['use_embedding_features'],
+                                              candidate_recall=config.get('candidate_recall'),
+                                              parse_cache_path=config.get('parse_cache_path'),
+                                              num_prediction_trees=num_prediction_trees,
+                                              thread_count=thread_count,
+                                              seed=config['seed'])
+
     def _predict(self, test_documents: typing.List[data.Document]) -> typing.List[data.Document]:
         if self.estimator is None: 
-            config = {
-                "negative_sampling_rate": self._negative_sampling,
-                "num_trees": self._num_trees,
-                "use_pos_features": self._use_pos_features,
-                "use_embedding_features": self._use_embedding_features,
-                "num_passes": self._num_passes,
-                "context_size": self._context_size,
-                "relation_tags": ['Flow', 'Uses', 'Actor Performer', 'Actor Recipient', 'Further Specification', 'Same Gateway'],
-                "ner_tags": ['Activity', 'Actor', 'Activity Data', 'Condition Specification',
-                    'Further Specification', 'AND Gateway', 'XOR Gateway'],
-                "name": self._name,
-                "seed": self._seed,
-                "depth": self._depth,
-                "learning_rate": self._learning_rate,
-                "verbose": True
-            }
-            self.estimator = relations.CatBoostRelationEstimator.load_model(config)
-        test_documents = [d.copy(clear_relations=True) for d in test_documents]
-        return self.estimator.predict(test_documents)
+            self.estimator = relations.CatBoostRelationEstimator.load_model(self.estimator_config())
+        test_documents = [d.copy(clear_relations=True, share_annotations=True) for d in test_documents]
+        return self.estimator.predict(test_documents, num_trees=self._num_prediction_trees,
+                                      thread_count=self._thread_count)
 
 class NeuralRelationExtraction(PipelineStep):
     def __init__(self, name: str, negative_sampling_rate: float,
@@ -202,7 +250,7 @@ class NeuralRelationExtraction(PipelineStep):
             relation_tags=relation_tags
         )
         estimator.train(train_documents)
-        test_documents = [d.copy(clear_relations=True) for d in test_documents]
+        test_documents = [d.copy(clear_relations=True, share_annotations=True) for d in test_documents]
         return estimator.predict(test_documents)
 
 
@@ -242,7 +290,7 @@ class RuleBasedRelationExtraction(PipelineStep):
             relations.rules.UsesRelationRule(activity_data_tag=activity_data, activity_tag=activity,
                                              uses_relation_tag=uses)
         ])
-        test_documents = [d.copy(clear_relations=True) for d in test_documents]
+        test_documents = [d.copy(clear_relations=True, share_annotations=True) for d in test_documents]
         return extractor.predict(test_documents)
 
 
@@ -264,7 +312,7 @@ class CrfMentionEstimatorStep(PipelineStep):
     def _predict(self, test_documents: typing.List[data.Document]) -> typing.List[data.Document]:
         if self.estimator is None:
             self.estimator = mentions.ConditionalRandomFieldsEstimator.load_model(self._name)
-        mention_extraction_input = [d.copy(clear_mentions=True) for d in test_documents]
+        mention_extraction_input = [d.copy(clear_mentions=True, share_annotations=True) for d in test_documents]
         return self.estimator.predict(mention_extraction_input)
 
     def _run(self, *,
@@ -299,7 +347,7 @@ class NeuralCoReferenceResolutionStep(PipelineStep):
     def _run(self, *,
              train_documents: typing.List[data.Document],
              test_documents: typing.List[data.Document], training_only: bool = False) -> typing.List[data.Document]:
-        test_documents = [d.copy(clear_entities=True) for d in test_documents]
+        test_documents = [d.copy(clear_entities=True, share_annotations=True) for d in test_documents]
         solver = coref.NeuralCoRefSolver(self._resolved_tags,
                                          ner_tag_strategy=self._ner_strategy,
                                          min_mention_overlap=self._mention_overlap,
@@ -324,6 +372,6 @@ class NaiveCoReferenceResolutionStep(PipelineStep):
     def _run(self, *,
              train_documents: typing.List[data.Document],
              test_documents: typing.List[data.Document], training_only: bool = False) -> typing.List[data.Document]:
-        test_documents = [d.copy(clear_entities=True) for d in test_documents]
+        test_documents = [d.copy(clear_entities=True, share_annotations=True) for d in test_documents]
         solver = coref.NaiveCoRefSolver(self._resolved_tags, min_mention_overlap=self._mention_overlap)
         return solver.resolve_co_references(test_documents)
@@ -1,2 +1,10 @@
 from relations.rules import RelationExtractionRule, RuleBasedRelationEstimator
-from relations.catboost import CatBoostRelationEstimator
+
+
+def __getattr__(name):
+    # the cat-boost estimator pulls in catboost and numpy,
+    # only import it when it is actually used
+    if name == "CatBoostRelationEstimator":
+        from relations.catboost import CatBoostRelationEstimator
+        return CatBoostRelationEstimator
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
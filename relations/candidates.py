@@ -0,0 +1,184 @@
+import collections
+import math
+import typing
+
+import numpy as np
+
+import data
+
+
+def all_mention_pairs(num_mentions: int) -> np.ndarray:
+    """
+    All ordered pairs of distinct mentions, as (head, tail) rows. Each pair
+    of mentions occurs forward and directly after that backward.
+    """
+    heads, tails = np.triu_indices(num_mentions, k=1)
+    forward = np.stack([heads, tails], axis=1)
+    backward = np.stack([tails, heads], axis=1)
+    return np.stack([forward, backward], axis=1).reshape(-1, 2)
+
+
+class CandidatePairFilter:
+    """
+    Prunes (head, tail) mention pairs that are very unlikely to hold a relation, before
+    they are scored by a relation estimator. Learns from the relations in the training data,
+    which combinations of head and tail ner tag occur, and within which (signed) mention and
+    sentence distances, e.g. actors far apart from each other are never related.
+
+    :param recall_target: fraction of training relations the learned limits have to keep,
+                          lower values prune more pairs
+    """
+
+    def __init__(self, recall_target: float = 0.99):
+        assert 0.0 < recall_target <= 1.0
+        self._recall_target = recall_target
+        # (head tag, tail tag) -> (min mention distance, max mention distance,
+        #                          min sentence distance, max sentence distance)
+        self._limits: typing.Dict[typing.Tuple[str, str], typing.Tuple[int, int, int, int]] = {}
+        self._recall: typing.Optional[float] = None
+        # lookup tables indexed by ner tag ids, see _tables
+        self._tables_for_num_tags = -1
+        self._allowed: typing.Optional[np.ndarray] = None
+        self._bounds: typing.Optional[np.ndarray] = None
+
+    @property
+    def recall(self) -> typing.Optional[float]:
+        """
+        Fraction of relations in the training documents that pass the filter.
+        """
+        return self._recall
+
+    def fit(self, documents: typing.List[data.Document]) -> "CandidatePairFilter":
+        samples = [s for d in documents for s in self._relation_samples(d)]
+        assert len(samples) > 0, "Can not learn candidate pairs without any relations."
+
+        num_allowed_misses = math.floor(len(samples) * (1.0 - self._recall_target))
+
+        by_tag_pair = collections.defaultdict(list)
+        for sample in samples:
+            by_tag_pair[sample[:2]].append(sample)
+
+        # drop the rarest tag combinations first, ...
+        for tag_pair, tag_pair_samples in sorted(by_tag_pair.items(), key=lambda item: len(item[1])):
+            if len(tag_pair_samples) > num_allowed_misses:
+                break
+            num_allowed_misses -= len(tag_pair_samples)
+            del by_tag_pair[tag_pair]
+
+        # ... then the relations spanning the most mentions
+        kept = sorted([s for ss in by_tag_pair.values() for s in ss], key=lambda s: abs(s[3]), reverse=True)
+        kept = kept[num_allowed_misses:]
+
+        learned_limits = {}
+        for head_tag, tail_tag, sentence_distance, mention_distance in kept:
+            limits = learned_limits.get((head_tag, tail_tag),
+                                        (mention_distance, mention_distance, sentence_distance, sentence_distance))
+            learned_limits[(head_tag, tail_tag)] = (
+                min(limits[0], mention_distance), max(limits[1], mention_distance),
+                min(limits[2], sentence_distance), max(limits[3], sentence_distance)
+            )
+        self._set_limits(learned_limits)
+
+        self._recall = sum(self._is_candidate(*s) for s in samples) / len(samples)
+        num_pairs = sum(len(d.mentions) * (len(d.mentions) - 1) for d in documents)
+        num_candidates = sum(len(self.filter(d, all_mention_pairs(len(d.mentions)))) for d in documents)
+        print(f'Candidate pair filter keeps {self._recall:.2%} of training relations '
+              f'(target {self._recall_target:.2%}), and {num_candidates}/{num_pairs} mention pairs.')
+        return self
+
+    def filter(self, document: data.Document, pairs: np.ndarray) -> np.ndarray:
+        """
+        :param pairs: (head mention index, tail mention index) rows
+        :returns: the rows of pairs that are candidates for a relation, in their original order
+        """
+        if len(pairs) == 0:
+            return pairs
+        allowed, bounds = self._tables()
+
+        tag_ids = np.array([m.ner_tag_id for m in document.mentions], dtype=np.int64)
+        sentence_indices = np.array([m.get_sentence_index(document) for m in document.mentions], dtype=np.int64)
+
+        heads = pairs[:, 0]
+        tails = pairs[:, 1]
+        head_tags = tag_ids[heads]
+        tail_tags = tag_ids[tails]
+        mention_distances = tails - heads
+        sentence_distances = sentence_indices[tails] - sentence_indices[heads]
+
+        pair_bounds = bounds[head_tags, tail_tags]
+        mask = allowed[head_tags, tail_tags]
+        mask &= (pair_bounds[:, 0] <= mention_distances) & (mention_distances <= pair_bounds[:, 1])
+        mask &= (pair_bounds[:, 2] <= sentence_distances) & (sentence_distances <= pair_bounds[:, 3])
+        return pairs[mask]
+
+    def _set_limits(self, limits: typing.Dict[typing.Tuple[str, str], typing.Tuple[int, int, int, int]]) -> None:
+        self._limits = limits
+        # intern all tags right away, so their ids are covered by the lookup tables
+        for head_tag, tail_tag in limits:
+            data.NER_TAGS.id(head_tag)
+            data.NER_TAGS.id(tail_tag)
+        self._tables_for_num_tags = -1
+
+    def _tables(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        # tag ids are assigned while documents are read, rebuild the tables if there are new ones
+        num_tags = len(data.NER_TAGS)
+        if self._tables_for_num_tags != num_tags:
+            self._allowed = np.zeros((num_tags, num_tags), dtype=bool)
+            self._bounds = np.zeros((num_tags, num_tags, 4), dtype=np.int64)
+            for (head_tag, tail_tag), limits in self._limits.items():
+                head_id = data.NER_TAGS.id(head_tag)
+                tail_id = data.NER_TAGS.id(tail_tag)
+                self._allowed[head_id, tail_id] = True
+                self._bounds[head_id, tail_id] = limits
+            self._tables_for_num_tags = num_tags
+        return self._allowed, self._bounds
+
+    def _is_candidate(self, head_tag: str, tail_tag: str, sentence_distance: int, mention_distance: int) -> bool:
+        limits = self._limits.get((head_tag, tail_tag))
+        if limits is None:
+            return False
+        return limits[0] <= mention_distance <= limits[1] and limits[2] <= sentence_distance <= limits[3]
+
+    @staticmethod
+    def _relation_samples(document: data.Document) -> typing.List[typing.Tuple[str, str, int, int]]:
+        samples = []
+        for relation in document.relations:
+            head = document.mentions[relation.head_mention_index]
+            tail = document.mentions[relation.tail_mention_index]
+            samples.append((
+                head.canonical_ner_tag,
+                tail.canonical_ner_tag,
+                tail.get_sentence_index(document) - head.get_sentence_index(document),
+                relation.tail_mention_index - relation.head_mention_index
+            ))
+        return samples
+
+    def to_json_serializable(self):
+        return {
+            "recallTarget": self._recall_target,
+            "recall": self._recall,
+            "limits": [
+                {
+                    "headTag": head_tag,
+                    "tailTag": tail_tag,
+                    "minMentionDistance": limits[0],
+                    "maxMentionDistance": limits[1],
+                    "minSentenceDistance": limits[2],
+                    "maxSentenceDistance": limits[3],
+                }
+                for (head_tag, tail_tag), limits in sorted(self._limits.items())
+            ]
+        }
+
+    @staticmethod
+    def from_json_serializable(state: typing.Dict[str, typing.Any]) -> "CandidatePairFilter":
+        candidate_filter = CandidatePairFilter(recall_target=state["recallTarget"])
+        candidate_filter._recall = state["recall"]
+        candidate_filter._set_limits({
+            (limits["headTag"], limits["tailTag"]): (
+                limits["minMentionDistance"], limits["maxMentionDistance"],
+                limits["minSentenceDistance"], limits["maxSentenceDistance"]
+            )
+            for limits in state["limits"]
+        })
+        return candidate_filter
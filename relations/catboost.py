@@ -1,28 +1,46 @@
-import collections
+import copy
+import dataclasses
 import functools
-import itertools
+import hashlib
+import json
+import os
 import random
 import typing
 
 import catboost
-import nltk
 import numpy as np
-import spacy
-from gensim import downloader
-from spacy import tokens
 
 import data
-from relations import sampler
+from relations import candidates, parse_cache, sampler
 
-try:
-    nltk.data.find("wordnet")
-except LookupError:
-    nltk.download("wordnet")
 
-try:
-    nltk.data.find("omw-1.4")
-except LookupError:
-    nltk.download("omw-1.4")
+# bump when the features built for a document change, invalidates all feature cache entries
+_FEATURE_CACHE_VERSION = 2
+
+
+@functools.lru_cache(maxsize=None)
+def _load_word_embeddings(name: str):
+    from gensim import downloader
+
+    return downloader.load(name)
+
+
+@dataclasses.dataclass
+class _MentionFeatureTable:
+    """
+    Attributes of each mention in a document that pair features are built from,
+    computed once per document and pass. Arrays are indexed by mention index.
+    """
+    sentence_indices: np.ndarray
+    lengths: np.ndarray
+    # one additional entry, the tag of "mentions" outside the document
+    ner_tags: np.ndarray
+    # document level index of the mention's syntactic root token,
+    # as well as its dependency label, pos tag and depth in the dependency tree
+    root_token_indices: np.ndarray
+    dependencies: np.ndarray
+    pos_tags: np.ndarray
+    depths: np.ndarray
 
 
 class CatBoostRelationEstimator:
@@ -44,7 +62,23 @@ class CatBoostRelationEstimator:
         seed: int = 42,
         device: str = None,
         device_ids: str = None,
+        candidate_recall: float = None,
+        parse_cache_path: str = None,
+        thread_count: int = -1,
+        feature_cache_dir: str = None,
     ):
+        """
+        :param candidate_recall: if given, only score mention pairs a candidates.CandidatePairFilter
+                                 learned from the training data with this recall target lets through,
+                                 instead of all pairs
+        :param parse_cache_path: file to additionally keep dependency parses of sentences in,
+                                 see parse_cache.ParseCache
+        :param thread_count: number of threads cat-boost uses for training and prediction,
+                             -1 uses all cores
+        :param feature_cache_dir: directory to keep the training samples of each document and pass in,
+                                  so training on overlapping sets of documents (e.g. folds) only builds
+                                  features for documents not seen before
+        """
         self._no_relation_tag = "NO REL"
         if class_weights is not None:
             class_weights[self._no_relation_tag] = 1.0
@@ -56,6 +90,10 @@ class CatBoostRelationEstimator:
         self._negative_rate = negative_sampling_rate
         self._target_tags = [t.lower() for t in relation_tags]
         self._ner_tags = [t.lower() for t in ner_tags]
+        self._target_tag_ids = [data.RELATION_TAGS.id(t) for t in relation_tags]
+        # tag id -> position of the tag in self._target_tags (self._ner_tags)
+        self._target_tag_positions = {t: i for i, t in enumerate(self._target_tag_ids)}
+        self._ner_tag_positions = {data.NER_TAGS.id(t): i for i, t in enumerate(ner_tags)}
         self._verbose = verbose
         self._name = name
         self._context_size = context_size
@@ -64,119 +102,322 @@ class CatBoostRelationEstimator:
         self._use_embedding_features = use_embedding_features
         self._seed = seed
         self._embedding_size = 25
-        self._embedder: typing.Optional = None
-        if self._use_embedding_features:
-            self._embedder = downloader.load("glove-twitter-25")
-        self._nlp = spacy.load("en_core_web_sm")
         self._device = device
         self._device_ids = device_ids
+        self._candidate_recall = candidate_recall
+        self._candidate_filter: typing.Optional[candidates.CandidatePairFilter] = None
+        self._parse_cache_path = parse_cache_path
+        self._thread_count = thread_count
+        self._feature_cache_dir = feature_cache_dir
+
+    @property
+    def _parse_cache(self) -> parse_cache.ParseCache:
+        return parse_cache.shared_parse_cache("en_core_web_sm", self._parse_cache_path)
+
+    @property
+    def _embedder(self):
+        return _load_word_embeddings("glove-twitter-25")
+
+    @property
+    def tree_count(self) -> int:
+        """
+        Number of trees available for prediction, i.e. in the smallest model of all passes.
+        """
+        assert len(self._model) > 0, "No trained or loaded model."
+        return min(model.tree_count_ for model in self._model.values())
 
     @staticmethod
-    def load_model(config: dict):
+    def model_path(name: str, pass_id: int) -> str:
+        # the first pass keeps the historic file name, so single pass models stay loadable
+        if pass_id == 0:
+            return f"api/models/catboost/{name}.cbm"
+        return f"api/models/catboost/{name}.pass-{pass_id}.cbm"
+
+    @staticmethod
+    def candidate_filter_path(name: str) -> str:
+        return f"api/models/catboost/{name}.candidates.json"
+
+    @staticmethod
+    def load_model(config: dict, model_blobs: typing.Optional[typing.List[bytes]] = None,
+                   candidate_filter: typing.Optional[typing.Dict[str, typing.Any]] = None):
+        """
+        Loads the models of all passes, either from their files in api/models/catboost,
+        or from already serialized models (one per pass), e.g. taken from a pipeline bundle.
+
+        :param candidate_filter: serialized candidate pair filter, if the estimator uses one,
+                                 read from api/models/catboost if not given
+        """
         estimator = CatBoostRelationEstimator(**config)
 
+        if estimator._candidate_recall is not None:
+            if candidate_filter is None:
+                with open(CatBoostRelationEstimator.candidate_filter_path(config["name"]), "r", encoding="utf8") as f:
+                    candidate_filter = json.load(f)
+            estimator._candidate_filter = candidates.CandidatePairFilter.from_json_serializable(candidate_filter)
+
         num_passes = config["num_passes"]
         name = config["name"]
+        if model_blobs is not None:
+            assert len(model_blobs) == num_passes
         print(name)
         for pass_id in range(num_passes):
-            model_path_str = f"api/models/catboost/{name}.cbm"
             estimator._model[pass_id] = catboost.CatBoostClassifier()
-            estimator._model[pass_id].load_model(model_path_str)
+            if model_blobs is not None:
+                estimator._model[pass_id].load_model(blob=model_blobs[pass_id])
+            else:
+                estimator._model[pass_id].load_model(
+                    CatBoostRelationEstimator.model_path(name, pass_id)
+                )
         return estimator
 
+    def save_model(self) -> typing.List[str]:
+        paths = []
+        for pass_id, model in sorted(self._model.items()):
+            path = self.model_path(self._name, pass_id)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # replace at once, the served model may be loaded from the same path meanwhile
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            model.save_model(temporary_path)
+            os.replace(temporary_path, path)
+            paths.append(path)
+        if self._candidate_filter is not None:
+            path = self.candidate_filter_path(self._name)
+            temporary_path = f"{path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w", encoding="utf8") as f:
+                json.dump(self._candidate_filter.to_json_serializable(), f)
+            os.replace(temporary_path, path)
+            paths.append(path)
+        return paths
+
     def train(
         self, documents: typing.List[data.Document]
     ) -> "CatBoostRelationEstimator":
         random.seed(self._seed)
+        if self._candidate_recall is not None:
+            self._candidate_filter = candidates.CandidatePairFilter(self._candidate_recall).fit(documents)
         for pass_id in range(self._num_passes):
             print(f"Training pass #{pass_id + 1}/{self._num_passes}")
-            self._model[pass_id] = catboost.CatBoostClassifier(
-                iterations=self._num_trees,
-                verbose=False,
-                random_state=self._seed,
-                depth=self._depth,
-                class_weights=self._class_weights,
-                learning_rate=self._learning_rate,
-                task_type=self._device,
-                devices=self._device_ids,
-            )
+            self._model[pass_id] = self._new_classifier(self._num_trees)
 
             samples = self._get_samples(documents, pass_id)
             xs = [x for x, _ in samples]
             ys = [y for _, y in samples]
 
-            cat_features_start = 4
-            num_cat_features = 4
-            if self._use_pos_features:
-                num_cat_features += 2
-            num_cat_features += self._context_size * 4
-
-            cat_features = list(
-                range(cat_features_start, cat_features_start + num_cat_features)
-            )
             self._model[pass_id].fit(
-                xs, ys, cat_features=cat_features, verbose=self._verbose
+                catboost.Pool(xs, ys, cat_features=self._cat_feature_indices()),
+                verbose=self._verbose,
             )
 
+        self.save_model()
         return self
 
+    def continue_training(
+        self, documents: typing.List[data.Document], num_trees: typing.Optional[int] = None
+    ) -> "CatBoostRelationEstimator":
+        """
+        Trains a copy of this estimator on the given (new) documents, the model of each pass
+        continues from this estimator's model of that pass, i.e. keeps its trees and adds
+        new ones. This estimator stays unchanged, the copy's models are not saved.
+
+        :param num_trees: number of trees to add per pass, as many as in training if not given
+        """
+        assert len(self._model) == self._num_passes, "Can only continue training trained or loaded models."
+        updated = copy.copy(self)
+        updated._model = {}
+        random.seed(self._seed)
+        for pass_id in range(self._num_passes):
+            print(f"Continuing training pass #{pass_id + 1}/{self._num_passes}")
+            samples = updated._get_samples(documents, pass_id)
+            if len(samples) == 0:
+                raise ValueError("None of the documents can be trained on, they need mentions, entities and relations.")
+            xs = [x for x, _ in samples]
+            ys = [y for _, y in samples]
+
+            # cat-boost can only continue learning if the data covers the classes of the current model
+            current_model = self._model[pass_id]
+            missing_classes = set(current_model.classes_) - set(ys)
+            if len(missing_classes) > 0:
+                raise ValueError(f"Can not continue training, there are no samples of classes {sorted(missing_classes)}, "
+                                 f"e.g. add some of the original training documents.")
+            updated._model[pass_id] = self._new_classifier(
+                num_trees if num_trees is not None else self._num_trees,
+                class_names=list(current_model.classes_),
+            )
+            updated._model[pass_id].fit(
+                catboost.Pool(xs, ys, cat_features=self._cat_feature_indices()),
+                init_model=current_model,
+                verbose=self._verbose,
+            )
+        return updated
+
+    def _new_classifier(
+        self, num_trees: int, class_names: typing.Optional[typing.List[str]] = None
+    ) -> catboost.CatBoostClassifier:
+        return catboost.CatBoostClassifier(
+            iterations=num_trees,
+            verbose=False,
+            random_state=self._seed,
+            depth=self._depth,
+            class_weights=self._class_weights,
+            class_names=class_names,
+            learning_rate=self._learning_rate,
+            task_type=self._device,
+            devices=self._device_ids,
+            thread_count=self._thread_count,
+        )
+
     def predict(
-        self, documents: typing.List[data.Document]
+        self,
+        documents: typing.List[data.Document],
+        num_trees: typing.Optional[int] = None,
+        thread_count: typing.Optional[int] = None,
     ) -> typing.List[data.Document]:
+        """
+        :param num_trees: only use the first num_trees trees of each pass' model, which is faster
+                          but less accurate, all trees if not given, see tree_count
+        :param thread_count: overrides the estimator's thread count for this call
+        """
+        predictions, _ = self.predict_with_probabilities(documents, num_trees, thread_count)
+        return predictions
+
+    def predict_with_probabilities(
+        self,
+        documents: typing.List[data.Document],
+        num_trees: typing.Optional[int] = None,
+        thread_count: typing.Optional[int] = None,
+    ) -> typing.Tuple[typing.List[data.Document], typing.List[np.ndarray]]:
+        """
+        Same as predict, additionally returns for each document the probability
+        the model assigns to each of its predicted relations, in the same order.
+        """
         assert all([len(d.entities) > 0 for d in documents])
         assert all([len(d.relations) == 0 for d in documents])
 
-        last_pass = [d.copy(clear_relations=True) for d in documents]
+        last_pass = [d.copy(clear_relations=True, share_annotations=True) for d in documents]
+        probabilities = [np.zeros(0) for _ in documents]
         for pass_id in range(self._num_passes):
             print(f"Prediction pass #{pass_id + 1}/{self._num_passes}")
-            predict_on_documents = [d.copy(clear_relations=True) for d in documents]
-            last_pass = self._predict(pass_id, predict_on_documents, last_pass)
-        return last_pass
+            predict_on_documents = [d.copy(clear_relations=True, share_annotations=True) for d in documents]
+            last_pass, probabilities = self._predict(
+                pass_id, predict_on_documents, last_pass, num_trees, thread_count
+            )
+        return last_pass, probabilities
+
+    def _cat_feature_indices(self) -> typing.List[int]:
+        # see _build_feature_matrix for the order of columns
+        cat_features_start = 4
+        num_cat_features = 4
+        if self._use_pos_features:
+            num_cat_features += 2
+        num_cat_features += self._context_size * 4
+        return list(range(cat_features_start, cat_features_start + num_cat_features))
 
     def _predict(
         self,
         pass_id: int,
         documents: typing.List[data.Document],
         last_passes: typing.List[data.Document],
-    ) -> typing.List[data.Document]:
+        num_trees: typing.Optional[int] = None,
+        thread_count: typing.Optional[int] = None,
+    ) -> typing.Tuple[typing.List[data.Document], typing.List[np.ndarray]]:
+        """
+        Scores the candidate pairs of all documents in a single call to cat-boost,
+        which is faster than one call per document, as it validates and converts
+        the (categorical) features only once, and parallelizes over all rows.
+
+        :returns: the documents with predicted relations, and the probability of each of them
+        """
+        # parse all sentences in one batch, they are looked up per document below
+        self._parse_cache.parse([[t.text for t in s] for d in documents for s in d.sentences])
+
+        pairs_by_document: typing.List[np.ndarray] = []
+        feature_matrices: typing.List[np.ndarray] = []
         for document, last_pass in zip(documents, last_passes):
-            spacy_sentences = self._get_spacy_sentences(document)
-            feature_builder = functools.partial(
-                self._build_features,
-                document=document,
-                last_pass=last_pass,
-                spacy_sentences=spacy_sentences,
+            argument_indices = candidates.all_mention_pairs(len(document.mentions))
+            if self._candidate_filter is not None:
+                argument_indices = self._candidate_filter.filter(document, argument_indices)
+            pairs_by_document.append(argument_indices)
+            if len(argument_indices) == 0:
+                continue
+
+            mention_features = self._mention_feature_table(
+                document, self._parse_sentences(document)
+            )
+            relation_counts = None
+            if self._num_passes > 1:
+                relation_counts = self._relation_counts(last_pass.relations, len(document.mentions))
+            feature_matrices.append(self._build_feature_matrix(
+                document, mention_features, argument_indices, relation_counts
+            ))
+
+        model = self._model[pass_id]
+        ys = np.empty(0, dtype=object)
+        scores = np.empty(0)
+        if len(feature_matrices) > 0:
+            pool = catboost.Pool(
+                np.concatenate(feature_matrices), cat_features=self._cat_feature_indices()
             )
-            argument_indices: typing.List[typing.Tuple[int, int]] = []
-            for mention_index_pair in itertools.combinations(
-                range(len(document.mentions)), 2
-            ):
-                argument_indices.append(mention_index_pair)  # forward
-                argument_indices.append(mention_index_pair[::-1])  # backward
-
-            xs = list(map(feature_builder, argument_indices))
-            ys = self._model[pass_id].predict(xs)
-            document.relations = self._get_relations_from_predictions(
-                argument_indices, ys, document
+            # cat-boost rejects more trees than the model has, 0 uses all of them
+            ntree_end = 0 if num_trees is None else min(num_trees, model.tree_count_)
+            class_probabilities = model.predict_proba(
+                pool,
+                ntree_end=ntree_end,
+                thread_count=self._thread_count if thread_count is None else thread_count,
             )
+            # same as model.predict, which picks the most probable class as well
+            best = class_probabilities.argmax(axis=1)
+            ys = np.asarray(model.classes_).astype(object)[best]
+            scores = class_probabilities[np.arange(len(best)), best]
+
+        probabilities = []
+        start = 0
+        for document, argument_indices in zip(documents, pairs_by_document):
+            end = start + len(argument_indices)
+            document.relations, document_probabilities = self._get_relations_from_predictions(
+                argument_indices.tolist(), ys[start:end], scores[start:end], document
+            )
+            probabilities.append(document_probabilities)
+            start = end
+        assert start == len(ys)
 
-        return documents
+        return documents, probabilities
 
     @staticmethod
-    def _sub_sample_document_relations(
-        document: data.Document, rate: float
-    ) -> data.Document:
+    def _sub_sample_relations(
+        relations: typing.List[data.Relation], rate: float, rng: random.Random
+    ) -> typing.List[data.Relation]:
         assert 0.0 <= rate <= 1.0
-        ret = document.copy(clear_relations=True)
-        for r in document.relations:
-            if random.random() <= rate:
-                ret.relations.append(r.copy())
-        return ret
+        return [r for r in relations if rng.random() <= rate]
+
+    def _relation_counts(
+        self, relations: typing.List[data.Relation], num_mentions: int
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Number of the given relations each mention is head (outgoing) or tail (incoming) of,
+        by target tag, as matrices of shape (number of mentions, number of target tags).
+        """
+        heads = []
+        tails = []
+        tag_positions = []
+        for relation in relations:
+            tag_position = self._target_tag_positions.get(relation.tag_id)
+            if tag_position is None:
+                continue
+            heads.append(relation.head_mention_index)
+            tails.append(relation.tail_mention_index)
+            tag_positions.append(tag_position)
+
+        outgoing = np.zeros((num_mentions, len(self._target_tag_ids)), dtype=np.int64)
+        incoming = np.zeros((num_mentions, len(self._target_tag_ids)), dtype=np.int64)
+        np.add.at(outgoing, (heads, tag_positions), 1)
+        np.add.at(incoming, (tails, tag_positions), 1)
+        return outgoing, incoming
 
     def _get_samples(
         self, documents: typing.List[data.Document], pass_id: int
     ) -> typing.List[typing.Tuple[typing.List, str]]:
         samples = []
+        num_built = 0
         document: data.Document
         for document in documents:
             if len(document.mentions) == 0:
@@ -185,62 +426,118 @@ class CatBoostRelationEstimator:
                 continue
             if len(document.relations) == 0:
                 continue
-            spacy_sentences = self._get_spacy_sentences(document)
-
-            if self._num_passes > 1:
-                sub_sampling_rate = pass_id / (self._num_passes - 1)
-                teacher_forced_last_pass = self._sub_sample_document_relations(
-                    document, sub_sampling_rate
-                )
-            else:
-                teacher_forced_last_pass = document
-            feature_builder = functools.partial(
-                self._build_features,
-                document=document,
-                last_pass=teacher_forced_last_pass,
-                spacy_sentences=spacy_sentences,
-            )
 
-            samples_in_document = 0
-            for relation in document.relations:
-                head_mention_index = relation.head_mention_index
-                tail_mention_index = relation.tail_mention_index
-
-                x = feature_builder((head_mention_index, tail_mention_index))
-                y = relation.tag
-
-                samples.append((x, y))
-
-                samples_in_document += 1
+            # seeded per document, so its samples do not depend on the other documents
+            rng = random.Random(f"{self._seed}:{pass_id}:{document.id}")
+            if self._feature_cache_dir is None:
+                samples.extend(self._get_document_samples(document, pass_id, rng))
+                continue
 
-            assert len(document.relations) <= samples_in_document
+            key = self._feature_cache_key(document, pass_id)
+            document_samples = self._read_cached_samples(key)
+            if document_samples is None:
+                document_samples = self._get_document_samples(document, pass_id, rng)
+                self._write_cached_samples(key, document_samples)
+                num_built += 1
+            samples.extend(document_samples)
+
+        if self._feature_cache_dir is not None:
+            print(f"Built features for {num_built} documents, "
+                  f"read the others from {self._feature_cache_dir}")
+        random.shuffle(samples)
+        return samples
 
-            negative_samples = sampler.negative_sample(
-                document,
-                num_positive=samples_in_document,
-                negative_rate=self._negative_rate,
-                verbose=self._verbose,
+    def _get_document_samples(
+        self, document: data.Document, pass_id: int, rng: random.Random
+    ) -> typing.List[typing.Tuple[typing.List, str]]:
+        """
+        :param rng: draws the document's negative samples and simulated previous pass
+        """
+        sentence_parses = self._parse_sentences(document)
+
+        # teacher forcing, the previous pass' output is simulated by a random subset
+        # of the gold relations, which grows with every pass
+        relation_counts = None
+        if self._num_passes > 1:
+            sub_sampling_rate = pass_id / (self._num_passes - 1)
+            relation_counts = self._relation_counts(
+                self._sub_sample_relations(document.relations, sub_sampling_rate, rng),
+                len(document.mentions),
             )
+        positive_samples = [
+            (r.head_mention_index, r.tail_mention_index) for r in document.relations
+        ]
+        negative_samples = sampler.negative_sample(
+            document,
+            num_positive=len(positive_samples),
+            negative_rate=self._negative_rate,
+            verbose=self._verbose,
+            rng=np.random.default_rng(rng.getrandbits(64)),
+        )
 
-            xs = list(map(feature_builder, negative_samples))
-            ys = [self._no_relation_tag] * len(xs)
-            samples.extend(zip(xs, ys))
-
-        random.shuffle(samples)
-        return samples
+        xs = self._build_feature_matrix(
+            document,
+            self._mention_feature_table(document, sentence_parses),
+            positive_samples + negative_samples,
+            relation_counts,
+        ).tolist()
+        ys = [r.tag for r in document.relations]
+        ys += [self._no_relation_tag] * len(negative_samples)
+        return list(zip(xs, ys))
+
+    def _feature_cache_key(self, document: data.Document, pass_id: int) -> str:
+        # everything the samples of a document depend on
+        content = json.dumps({
+            "version": _FEATURE_CACHE_VERSION,
+            "document": data.dump_document_to_json(document),
+            "passId": pass_id,
+            "numPasses": self._num_passes,
+            "contextSize": self._context_size,
+            "usePosFeatures": self._use_pos_features,
+            "useEmbeddingFeatures": self._use_embedding_features,
+            "negativeSamplingRate": self._negative_rate,
+            "relationTags": self._target_tags,
+            "seed": self._seed,
+        }, sort_keys=True)
+        return hashlib.sha1(content.encode("utf8")).hexdigest()
+
+    def _feature_cache_path(self, key: str) -> str:
+        return os.path.join(self._feature_cache_dir, f"{key}.json")
+
+    def _read_cached_samples(self, key: str) -> typing.Optional[typing.List[typing.Tuple[typing.List, str]]]:
+        if self._feature_cache_dir is None:
+            return None
+        try:
+            with open(self._feature_cache_path(key), "r", encoding="utf8") as f:
+                cached = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return list(zip(cached["xs"], cached["ys"]))
+
+    def _write_cached_samples(self, key: str, samples: typing.List[typing.Tuple[typing.List, str]]) -> None:
+        if self._feature_cache_dir is None:
+            return
+        os.makedirs(self._feature_cache_dir, exist_ok=True)
+        path = self._feature_cache_path(key)
+        # written under a temporary name first, concurrent trainings never read partial files
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w", encoding="utf8") as f:
+            json.dump({"xs": [x for x, _ in samples], "ys": [y for _, y in samples]}, f)
+        os.replace(temporary_path, path)
 
     def _get_relations_from_predictions(
         self,
         indices: typing.List[typing.Tuple[int, int]],
         ys: np.ndarray,
+        scores: np.ndarray,
         document: data.Document,
-    ) -> typing.List[data.Relation]:
-        assert len(indices) == len(ys)
+    ) -> typing.Tuple[typing.List[data.Relation], np.ndarray]:
+        assert len(indices) == len(ys) == len(scores)
 
         relations = []
+        kept = []
 
-        for (head_mention_index, tail_mention_index), tag in zip(indices, ys):
-            tag = tag[0]
+        for i, ((head_mention_index, tail_mention_index), tag) in enumerate(zip(indices, ys)):
             assert (
                 type(tag) == str
             ), f'Expected prediction to be string, got "{tag}" ({type(tag)})'
@@ -257,181 +554,155 @@ class CatBoostRelationEstimator:
                     tag=tag,
                 )
             )
+            kept.append(i)
+
+        return relations, scores[kept]
+
+    def _parse_sentences(self, document: data.Document) -> typing.List[parse_cache.SentenceParse]:
+        return self._parse_cache.parse([[t.text for t in sentence] for sentence in document.sentences])
+
+    def _mention_feature_table(
+        self, document: data.Document, sentence_parses: typing.List[parse_cache.SentenceParse]
+    ) -> _MentionFeatureTable:
+        num_mentions = len(document.mentions)
+        table = _MentionFeatureTable(
+            sentence_indices=np.zeros(num_mentions, dtype=np.int64),
+            lengths=np.zeros(num_mentions, dtype=np.int64),
+            ner_tags=np.full(num_mentions + 1, "", dtype=object),
+            root_token_indices=np.zeros(num_mentions, dtype=np.int64),
+            dependencies=np.full(num_mentions, "", dtype=object),
+            pos_tags=np.full(num_mentions, "", dtype=object),
+            depths=np.zeros(num_mentions, dtype=np.int64),
+        )
 
-        return relations
-
-    def _get_spacy_sentences(self, document: data.Document) -> typing.List[tokens.Doc]:
-        spacy_sentences: typing.List[tokens.Doc] = []
-        batch = [
-            tokens.Doc(self._nlp.vocab, [t.text for t in sentence])
-            for sentence in document.sentences
-        ]
-        doc: tokens.Doc
-        for doc in self._nlp.pipe(batch):
-            spacy_sentences.append(doc)
-        return spacy_sentences
-
-    def _build_features(
+        for i, mention in enumerate(document.mentions):
+            sentence_index = mention.get_sentence_index(document)
+            sentence_parse = sentence_parses[sentence_index]
+            token, index_in_sentence = self.root_token_for_mention(mention, document, sentence_parse)
+            table.sentence_indices[i] = sentence_index
+            table.lengths[i] = len(mention.token_document_indices)
+            table.ner_tags[i] = mention.ner_tag
+            table.root_token_indices[i] = token.index_in_document
+            table.dependencies[i] = sentence_parse.dependency(index_in_sentence)
+            table.pos_tags[i] = sentence_parse.pos_tag(index_in_sentence)
+            table.depths[i] = sentence_parse.depths[index_in_sentence]
+        return table
+
+    def _build_feature_matrix(
         self,
-        mention_index_pair: typing.Tuple[int, int],
         document: data.Document,
-        last_pass: data.Document,
-        spacy_sentences: typing.List[tokens.Doc],
-    ) -> typing.List:
-        assert document.name == last_pass.name
-
-        head_mention_index, tail_mention_index = mention_index_pair
-        head = document.mentions[head_mention_index]
-        tail = document.mentions[tail_mention_index]
-
-        context = []
-        for i in range(-self._context_size, self._context_size + 1):
-            if i == 0:
-                continue
-
-            mention_index = head_mention_index + i
-            if mention_index < 0:
-                context.append(None)
-            elif mention_index >= len(document.mentions):
-                context.append(None)
-            else:
-                context.append(document.mentions[mention_index])
-
-            mention_index = tail_mention_index + i
-            if mention_index < 0:
-                context.append(None)
-            elif mention_index >= len(document.mentions):
-                context.append(None)
-            else:
-                context.append(document.mentions[mention_index])
-
-        head_sentence_index = head.get_sentence_index(document)
-        _, head_spacy = self.root_token_for_mention(
-            head, document, spacy_sentences[head_sentence_index]
-        )
-        tail_sentence_index = tail.get_sentence_index(document)
-        _, tail_spacy = self.root_token_for_mention(
-            tail, document, spacy_sentences[tail_sentence_index]
-        )
-
-        features = [
-            tail_mention_index - head_mention_index,
-            tail_sentence_index - head_sentence_index,
-            len(head.token_document_indices),
-            len(tail.token_document_indices),
-            head.ner_tag,
-            tail.ner_tag,
-            head_spacy.dep_,
-            tail_spacy.dep_,
+        mention_features: _MentionFeatureTable,
+        mention_index_pairs: typing.Union[np.ndarray, typing.List[typing.Tuple[int, int]]],
+        relation_counts: typing.Optional[typing.Tuple[np.ndarray, np.ndarray]] = None,
+    ) -> np.ndarray:
+        """
+        Builds the features for all given (head, tail) mention index pairs at once, one row
+        per pair, by indexing into the attributes of single mentions.
+
+        Columns are:
+            mention distance, sentence distance, head length, tail length,
+            head tag, tail tag, head dependency, tail dependency,
+            head pos tag, tail pos tag (only with pos features),
+            tags of the mentions around head and tail, alternating, "" outside the document,
+            relations by tag starting at head, ending at tail (only with multiple passes),
+            head embedding, tail embedding (only with embedding features)
+
+        :param relation_counts: outgoing and incoming relation counts of each mention in the
+                                previous pass, see _relation_counts, needed with multiple passes
+        :returns: object array, numbers are python ints (floats), categorical features strings
+        """
+
+        num_mentions = len(document.mentions)
+        pairs = np.asarray(mention_index_pairs, dtype=np.int64).reshape(-1, 2)
+        heads = pairs[:, 0]
+        tails = pairs[:, 1]
+
+        sentence_indices = mention_features.sentence_indices
+        lengths = mention_features.lengths
+        ner_tags = mention_features.ner_tags
+        dependencies = mention_features.dependencies
+        pos_tags = mention_features.pos_tags
+
+        columns = [
+            (tails - heads)[:, None],
+            (sentence_indices[tails] - sentence_indices[heads])[:, None],
+            lengths[heads][:, None],
+            lengths[tails][:, None],
+            ner_tags[heads][:, None],
+            ner_tags[tails][:, None],
+            dependencies[heads][:, None],
+            dependencies[tails][:, None],
         ]
 
         if self._use_pos_features:
-            features += [
-                head_spacy.pos_,
-                tail_spacy.pos_,
+            columns += [
+                pos_tags[heads][:, None],
+                pos_tags[tails][:, None],
             ]
 
-        features += [m.ner_tag if m is not None else "" for m in context]
-
-        # mentions_between = [
-        #     document.mentions[i]
-        #     for i
-        #     in range(min(head_mention_index, tail_mention_index) + 1,
-        #              max(head_mention_index, tail_mention_index))
-        # ]
-        # mentions_between_count = {
-        #     tag: 0 for tag in self._ner_tags
-        # }
-        # for m in mentions_between:
-        #     mentions_between_count[m.ner_tag.lower()] += 1
-        #
-        # features += [
-        #     mentions_between_count[tag] for tag in sorted(list(mentions_between_count.keys()))
-        # ]
-
-        if self._num_passes > 1:
-            head_relations = last_pass.get_relations_by_mention(
-                head_mention_index, only_head=True
-            )
-            head_incoming_relations = collections.Counter(
-                [r.tag for r in head_relations]
-            )
-            # if len(head_relations) > 0:
-            #     print(head_relations)
+        offsets = np.array(
+            [i for i in range(-self._context_size, self._context_size + 1) if i != 0],
+            dtype=np.int64,
+        )
 
-            tail_relations = last_pass.get_relations_by_mention(
-                tail_mention_index, only_tail=True
-            )
-            tail_incoming_relations = collections.Counter(
-                [r.tag for r in tail_relations]
-            )
-            # if len(tail_relations) > 0:
-            #     print(tail_relations)
+        def context_tags(mention_indices: np.ndarray) -> np.ndarray:
+            context = mention_indices[:, None] + offsets[None, :]
+            context[(context < 0) | (context >= num_mentions)] = num_mentions
+            return ner_tags[context]
 
-            # if sum(head_incoming_relations.values()) > 0 or sum(tail_incoming_relations.values()) > 0:
-            #     print(f'head: {head_incoming_relations}, tail: {tail_incoming_relations}')
+        # for each offset the head's context mention comes first, then the tail's
+        columns.append(
+            np.stack([context_tags(heads), context_tags(tails)], axis=2).reshape(len(pairs), -1)
+        )
 
-            features += [
-                *[head_incoming_relations[t] for t in self._target_tags],
-                *[tail_incoming_relations[t] for t in self._target_tags],
-            ]
+        if self._num_passes > 1:
+            assert relation_counts is not None
+            outgoing, incoming = relation_counts
+            columns += [outgoing[heads], incoming[tails]]
 
         if self._use_embedding_features:
-            features += [
-                *self.embed_tokens(head.get_tokens(document)),
-                *self.embed_tokens(tail.get_tokens(document)),
-            ]
+            embeddings = np.zeros((num_mentions, self._embedding_size))
+            for i, mention in enumerate(document.mentions):
+                embeddings[i] = self.embed_tokens(mention.get_tokens(document))
+            columns += [embeddings[heads], embeddings[tails]]
 
-        return features
+        # casting to object turns numpy numbers into python numbers
+        return np.concatenate([c.astype(object) for c in columns], axis=1)
 
     def root_token_for_mention(
-        self, mention: data.Mention, document: data.Document, spacy_tokens: tokens.Doc
-    ) -> typing.Tuple[data.Token, tokens.Token]:
+        self,
+        mention: data.Mention,
+        document: data.Document,
+        sentence_parse: parse_cache.SentenceParse,
+    ) -> typing.Tuple[data.Token, int]:
+        """
+        The token of the mention that is closest to the root of the sentence's dependency tree.
+
+        :returns: the token and its index in the sentence
+        """
         sentence = document.sentences[mention.get_sentence_index(document)]
-        spacy_token: tokens.Token
 
         token_sentence_indices = [
-            t.index_in_sentence(document) for t in mention.get_tokens(document)
+            document.token_index_in_sentence(i) for i in mention.token_document_indices
         ]
 
         assert len(token_sentence_indices) > 0
-        if len(spacy_tokens) <= max(token_sentence_indices):
-            print("spacy: ", [t.text for t in spacy_tokens])
+        if len(sentence_parse) <= max(token_sentence_indices):
+            print("spacy: ", list(sentence_parse.words))
             print("org:   ", [t.text for t in sentence])
-        assert len(spacy_tokens) > max(token_sentence_indices), (
+        assert len(sentence_parse) > max(token_sentence_indices), (
             f'Mention "{mention.text(document)}" refers to tokens {token_sentence_indices}, '
-            f"but there are only {len(spacy_tokens)} tokens "
-            f"in sentence {spacy_tokens.text}, with original "
+            f"but there are only {len(sentence_parse)} tokens "
+            f"in sentence {' '.join(sentence_parse.words)}, with original "
             f"tokens {[t.text for t in sentence]}"
         )
 
-        mention_token_depths = {
-            mention_token_index: self._get_token_depth(
-                spacy_tokens[token_index_in_sentence]
-            )
-            for mention_token_index, token_index_in_sentence in enumerate(
-                token_sentence_indices
-            )
-        }
-
-        top_level_token_index: int = sorted(
-            mention_token_depths, key=mention_token_depths.get
-        )[0]
-
-        token = sentence[token_sentence_indices[top_level_token_index]]
-        spacy_token = spacy_tokens[
-            token_sentence_indices[top_level_token_index]
-        ]
-
-        return token, spacy_token
+        # first of the mention's tokens with the lowest depth
+        top_level_token_index = min(
+            token_sentence_indices, key=lambda index_in_sentence: sentence_parse.depths[index_in_sentence]
+        )
 
-    @staticmethod
-    def _get_token_depth(spacy_token: tokens.Token) -> int:
-        depth = 0
-        while spacy_token.head != spacy_token:
-            depth += 1
-            spacy_token = spacy_token.head
-        return depth
+        return sentence[top_level_token_index], top_level_token_index
 
     def embed_tokens(self, tokens: typing.List[data.Token]):
         words = [t.text for t in tokens]
@@ -446,13 +717,14 @@ class CatBoostRelationEstimator:
         one_hot = np.zeros(
             len(self._ner_tags),
         )
-        one_hot[self._ner_tags.index(ner_tag.lower())] = 1.0
+        one_hot[self._ner_tag_positions[data.NER_TAGS.id(ner_tag)]] = 1.0
         return one_hot
 
     def _relation_tag_to_one_hot(self, relation_tag: str) -> np.ndarray:
         target = np.zeros((len(self._target_tags) + 1,))
-        if relation_tag.lower() in self._target_tags:
-            target[self._target_tags.index(relation_tag)] = 1.0
+        position = self._target_tag_positions.get(data.RELATION_TAGS.id(relation_tag))
+        if position is not None:
+            target[position] = 1.0
         else:
             target[len(self._target_tags)] = 1.0
         return target
@@ -460,4 +732,4 @@ class CatBoostRelationEstimator:
     def _relation_tag_to_scalar(self, relation_tag: str) -> float:
         if relation_tag == self._no_relation_tag:
             return len(self._target_tags)
-        return self._target_tags.index(relation_tag.lower())
+        return self._target_tag_positions[data.RELATION_TAGS.id(relation_tag)]
@@ -0,0 +1,216 @@
+import array
+import collections
+import dataclasses
+import functools
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import typing
+
+# Dependency labels and pos tags of all parses, stored as small integer ids,
+# ids are process local and never written to disk.
+_LABELS: typing.List[str] = []
+_LABEL_IDS: typing.Dict[str, int] = {}
+
+
+def _label_id(label: str) -> int:
+    label_id = _LABEL_IDS.get(label)
+    if label_id is None:
+        label_id = len(_LABELS)
+        _LABELS.append(sys.intern(label))
+        _LABEL_IDS[_LABELS[label_id]] = label_id
+    return label_id
+
+
+@functools.lru_cache(maxsize=None)
+def _load_spacy_model(name: str):
+    # spacy and its models take seconds to load, only do so once they are needed
+    import spacy
+
+    return spacy.load(name)
+
+
+@dataclasses.dataclass
+class SentenceParse:
+    """
+    Dependency parse of a single sentence, all arrays are indexed by token index in the sentence.
+    """
+    words: typing.Tuple[str, ...]
+    # index of each token's head, the root is its own head
+    heads: array.array
+    dependency_ids: array.array
+    pos_tag_ids: array.array
+    # distance of each token to the root of the dependency tree
+    depths: array.array
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def dependency(self, token_index: int) -> str:
+        return _LABELS[self.dependency_ids[token_index]]
+
+    def pos_tag(self, token_index: int) -> str:
+        return _LABELS[self.pos_tag_ids[token_index]]
+
+    @staticmethod
+    def create(words: typing.Tuple[str, ...], heads: typing.Sequence[int],
+               dependencies: typing.Sequence[str], pos_tags: typing.Sequence[str]) -> "SentenceParse":
+        assert len(words) == len(heads) == len(dependencies) == len(pos_tags)
+        return SentenceParse(words=words,
+                             heads=array.array('i', heads),
+                             dependency_ids=array.array('H', [_label_id(d) for d in dependencies]),
+                             pos_tag_ids=array.array('H', [_label_id(p) for p in pos_tags]),
+                             depths=array.array('i', _token_depths(heads)))
+
+
+def _token_depths(heads: typing.Sequence[int]) -> typing.List[int]:
+    # walks up from every token only until a token with known depth is reached
+    depths = [-1] * len(heads)
+    for token_index in range(len(heads)):
+        path = []
+        while depths[token_index] < 0 and heads[token_index] != token_index:
+            path.append(token_index)
+            token_index = heads[token_index]
+        if depths[token_index] < 0:
+            # reached the root
+            depths[token_index] = 0
+        depth = depths[token_index]
+        for on_path in reversed(path):
+            depth += 1
+            depths[on_path] = depth
+    return depths
+
+
+class ParseCache:
+    """
+    Parses sentences (given as token texts) with a spacy model, each distinct sentence only once.
+    Parses are kept in memory (least recently used ones are evicted first), and optionally in
+    an sqlite database on disk, which can be shared between runs and processes.
+
+    :param max_size: maximum number of sentences kept in memory
+    :param cache_path: path of the on-disk cache, no on-disk cache if not given
+    """
+
+    def __init__(self, model_name: str = "en_core_web_sm", max_size: int = 100_000,
+                 cache_path: typing.Optional[str] = None):
+        self._model_name = model_name
+        self._max_size = max_size
+        self._parses: typing.OrderedDict[typing.Tuple[str, ...], SentenceParse] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: typing.Optional[sqlite3.Connection] = None
+        if cache_path is not None:
+            if os.path.dirname(cache_path):
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS parses "
+                "(key TEXT PRIMARY KEY, heads BLOB, dependencies TEXT, pos_tags TEXT)"
+            )
+            self._connection.commit()
+        self.num_parsed = 0
+
+    def __len__(self) -> int:
+        return len(self._parses)
+
+    def parse(self, sentences: typing.Sequence[typing.Sequence[str]]) -> typing.List[SentenceParse]:
+        """
+        :param sentences: token texts of each sentence
+        :returns: parse of each sentence, in the same order
+        """
+        keys = [tuple(words) for words in sentences]
+        with self._lock:
+            parses = [self._get(key) for key in keys]
+
+            missing = list(dict.fromkeys(key for key, parse in zip(keys, parses) if parse is None))
+            if not missing:
+                return parses
+            # kept here as well, the memory cache might evict some of them again right away
+            found = self._read_from_disk(missing)
+            missing = [key for key in missing if key not in found]
+            if missing:
+                found.update(self._parse(missing))
+
+            return [parse if parse is not None else found[key] for key, parse in zip(keys, parses)]
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _get(self, key: typing.Tuple[str, ...]) -> typing.Optional[SentenceParse]:
+        parse = self._parses.get(key)
+        if parse is not None:
+            self._parses.move_to_end(key)
+        return parse
+
+    def _put(self, key: typing.Tuple[str, ...], parse: SentenceParse) -> None:
+        self._parses[key] = parse
+        self._parses.move_to_end(key)
+        while len(self._parses) > self._max_size:
+            self._parses.popitem(last=False)
+
+    def _parse(self, keys: typing.List[typing.Tuple[str, ...]]) -> typing.Dict[typing.Tuple[str, ...], SentenceParse]:
+        from spacy import tokens
+
+        nlp = _load_spacy_model(self._model_name)
+        batch = [tokens.Doc(nlp.vocab, list(key)) for key in keys]
+        parses = {}
+        rows = []
+        for key, doc in zip(keys, nlp.pipe(batch)):
+            parse = SentenceParse.create(key,
+                                         heads=[t.head.i for t in doc],
+                                         dependencies=[t.dep_ for t in doc],
+                                         pos_tags=[t.pos_ for t in doc])
+            self._put(key, parse)
+            parses[key] = parse
+            rows.append((self._disk_key(key), parse.heads.tobytes(),
+                         " ".join(t.dep_ for t in doc), " ".join(t.pos_ for t in doc)))
+        self.num_parsed += len(keys)
+
+        if self._connection is not None:
+            self._connection.executemany("INSERT OR REPLACE INTO parses VALUES (?, ?, ?, ?)", rows)
+            self._connection.commit()
+        return parses
+
+    def _read_from_disk(
+        self, keys: typing.List[typing.Tuple[str, ...]]
+    ) -> typing.Dict[typing.Tuple[str, ...], SentenceParse]:
+        parses = {}
+        if self._connection is None:
+            return parses
+        keys_by_disk_key = {self._disk_key(key): key for key in keys}
+        disk_keys = list(keys_by_disk_key.keys())
+        # stay below sqlite's limit for query parameters
+        for start in range(0, len(disk_keys), 500):
+            chunk = disk_keys[start:start + 500]
+            rows = self._connection.execute(
+                f"SELECT key, heads, dependencies, pos_tags FROM parses WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            for disk_key, heads, dependencies, pos_tags in rows:
+                key = keys_by_disk_key[disk_key]
+                heads_array = array.array('i')
+                heads_array.frombytes(heads)
+                if len(key) == 0:
+                    dependencies, pos_tags = [], []
+                else:
+                    dependencies, pos_tags = dependencies.split(" "), pos_tags.split(" ")
+                parses[key] = SentenceParse.create(key, heads_array, dependencies, pos_tags)
+                self._put(key, parses[key])
+        return parses
+
+    def _disk_key(self, key: typing.Tuple[str, ...]) -> str:
+        # hashed, as sentences can get long, joined with a character that does not occur in token texts
+        content = "\x00".join((self._model_name,) + key)
+        return hashlib.sha1(content.encode("utf8")).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def shared_parse_cache(model_name: str = "en_core_web_sm", cache_path: typing.Optional[str] = None) -> ParseCache:
+    """
+    Parse cache shared by everything in this process using the same model
+    (and on-disk cache), e.g. all training passes, folds and predictions.
+    """
+    return ParseCache(model_name=model_name, cache_path=cache_path)
@@ -26,30 +26,36 @@ class RelationExtractionRule:
         raise NotImplementedError()
 
     @staticmethod
-    def get_next_index_of_mention_with_tag(document: data.Document, start_index: int, tags: typing.List[str],
+    def get_next_index_of_mention_with_tag(document: data.Document, start_index: int,
+                                           tags: typing.Union[typing.List[str], typing.FrozenSet[int]],
                                            search_backwards: bool = False) -> typing.Optional[int]:
+        """
+        :param tags: ner tags, or their ids in data.NER_TAGS
+        """
+        if not isinstance(tags, frozenset):
+            tags = data.NER_TAGS.ids(tags)
+
         search_indices = range(start_index, len(document.mentions))
         if search_backwards:
             search_indices = range(start_index, -1, -1)
 
-        mentions = document.mentions.copy()
+        mentions = document.mentions
         for i in search_indices:
-            mention = mentions[i]
-            if mention.ner_tag in tags:
+            if mentions[i].ner_tag_id in tags:
                 return i
         return None
 
 
 class SequenceFlowsRule(RelationExtractionRule):
     def __init__(self, triggering_elements: typing.List[str], target_tag: str, verbose: bool = False):
-        self._elements = triggering_elements
+        self._elements = data.NER_TAGS.ids(triggering_elements)
         self._tag = target_tag
         self._verbose = verbose
 
     def get_relations(self, document: data.Document) -> typing.List[data.Relation]:
         relations = []
         for i, current_mention in enumerate(document.mentions):
-            cur_mention_behavioural = current_mention.ner_tag in self._elements
+            cur_mention_behavioural = current_mention.ner_tag_id in self._elements
             if not cur_mention_behavioural:
                 continue
 
@@ -82,16 +88,17 @@ class SequenceFlowsRule(RelationExtractionRule):
 
 class SameGatewayRule(RelationExtractionRule):
     def __init__(self, triggering_elements: typing.List[str], target_tag: str):
-        self._elements = triggering_elements
+        self._elements = data.NER_TAGS.ids(triggering_elements)
         self._tag = target_tag
 
     def get_relations(self, document: data.Document) -> typing.List[data.Relation]:
         relations = []
         for i, mention in enumerate(document.mentions):
-            if mention.ner_tag not in self._elements:
+            if mention.ner_tag_id not in self._elements:
                 continue
 
-            next_gateway_index = self.get_next_index_of_mention_with_tag(document, i + 1, [mention.ner_tag])
+            next_gateway_index = self.get_next_index_of_mention_with_tag(document, i + 1,
+                                                                         frozenset([mention.ner_tag_id]))
             if next_gateway_index is None:
                 continue
 
@@ -116,20 +123,20 @@ class SameGatewayRule(RelationExtractionRule):
 
 class GatewayActivityRule(RelationExtractionRule):
     def __init__(self, gateway_tags: typing.List[str], activity_tag: str, same_gateway_tag: str, flow_tag: str):
-        self._gateways = gateway_tags
-        self._activity = activity_tag
-        self._same_gateway = same_gateway_tag
+        self._gateways = data.NER_TAGS.ids(gateway_tags)
+        self._activity = data.NER_TAGS.ids([activity_tag])
+        self._same_gateway = data.RELATION_TAGS.id(same_gateway_tag)
         self._tag = flow_tag
 
     def get_relations(self, document: data.Document) -> typing.List[data.Relation]:
         relations = []
         for i, mention in enumerate(document.mentions):
-            if mention.ner_tag not in self._gateways:
+            if mention.ner_tag_id not in self._gateways:
                 continue
             if self.is_mention_part_of_relation_with_tag(document, i, self._same_gateway):
                 continue
 
-            next_activity_index = self.get_next_index_of_mention_with_tag(document, i + 1, [self._activity])
+            next_activity_index = self.get_next_index_of_mention_with_tag(document, i + 1, self._activity)
             if next_activity_index is None:
                 continue
 
@@ -153,9 +160,9 @@ class GatewayActivityRule(RelationExtractionRule):
         return relations
 
     @staticmethod
-    def is_mention_part_of_relation_with_tag(document: data.Document, mention_index: int, tag: str) -> bool:
+    def is_mention_part_of_relation_with_tag(document: data.Document, mention_index: int, tag_id: int) -> bool:
         for relation in document.relations:
-            if relation.tag != tag:
+            if relation.tag_id != tag_id:
                 continue
             if relation.tail_entity_index == mention_index:
                 return True
@@ -167,8 +174,8 @@ class GatewayActivityRule(RelationExtractionRule):
 
 class ActorPerformerRecipientRule(RelationExtractionRule):
     def __init__(self, actor_tag: str, activity_tag: str, performer_tag: str, recipient_tag: str):
-        self._actor = actor_tag
-        self._activity = activity_tag
+        self._actor = data.NER_TAGS.ids([actor_tag])
+        self._activity = data.NER_TAGS.id(activity_tag)
         self._performer = performer_tag
         self._recipient = recipient_tag
 
@@ -176,10 +183,10 @@ class ActorPerformerRecipientRule(RelationExtractionRule):
         relations = []
 
         for i, mention in enumerate(document.mentions):
-            if not mention.ner_tag == self._activity:
+            if not mention.ner_tag_id == self._activity:
                 continue
 
-            performer_index = self.get_next_index_of_mention_with_tag(document, i, [self._actor],
+            performer_index = self.get_next_index_of_mention_with_tag(document, i, self._actor,
                                                                       search_backwards=True)
             if performer_index is not None:
                 if document.mentions[performer_index].sentence_index == mention.sentence_index:
@@ -194,7 +201,7 @@ class ActorPerformerRecipientRule(RelationExtractionRule):
                         evidence=list({mention.sentence_index, tail_mention.sentence_index})
                     ))
 
-            recipient_index = self.get_next_index_of_mention_with_tag(document, i, [self._actor])
+            recipient_index = self.get_next_index_of_mention_with_tag(document, i, self._actor)
             if recipient_index is not None:
                 if document.mentions[recipient_index].sentence_index == mention.sentence_index:
                     tail_mention = document.mentions[recipient_index]
@@ -214,19 +221,19 @@ class ActorPerformerRecipientRule(RelationExtractionRule):
 class FurtherSpecificationRule(RelationExtractionRule):
     def __init__(self, further_specification_element_tag: str, activity_tag: str,
                  further_specification_relation_tag: str):
-        self._further_spec = further_specification_element_tag
-        self._activity = activity_tag
+        self._further_spec = data.NER_TAGS.id(further_specification_element_tag)
+        self._activity = data.NER_TAGS.ids([activity_tag])
         self._tag = further_specification_relation_tag
 
     def get_relations(self, document: data.Document) -> typing.List[data.Relation]:
         relations = []
 
         for i, mention in enumerate(document.mentions):
-            if mention.ner_tag != self._further_spec:
+            if mention.ner_tag_id != self._further_spec:
                 continue
 
-            left_index = self.get_next_index_of_mention_with_tag(document, i, [self._activity], search_backwards=True)
-            right_index = self.get_next_index_of_mention_with_tag(document, i, [self._activity])
+            left_index = self.get_next_index_of_mention_with_tag(document, i, self._activity, search_backwards=True)
+            right_index = self.get_next_index_of_mention_with_tag(document, i, self._activity)
 
             if left_index is None and right_index is None:
                 continue
@@ -279,21 +286,21 @@ class FurtherSpecificationRule(RelationExtractionRule):
 
 class UsesRelationRule(RelationExtractionRule):
     def __init__(self, activity_data_tag: str, activity_tag: str, uses_relation_tag: str):
-        self._activity_data = activity_data_tag
-        self._activity = activity_tag
+        self._activity_data = data.NER_TAGS.id(activity_data_tag)
+        self._activity = data.NER_TAGS.ids([activity_tag])
         self._tag = uses_relation_tag
 
     def get_relations(self, document: data.Document) -> typing.List[data.Relation]:
         relations = []
         for i, mention in enumerate(document.mentions):
-            if mention.ner_tag != self._activity_data:
+            if mention.ner_tag_id != self._activity_data:
                 continue
 
             activity_index = self.get_next_index_of_mention_with_tag(document, i - 1,
-                                                                     [self._activity], search_backwards=True)
+                                                                     self._activity, search_backwards=True)
 
             if activity_index is None or document.mentions[activity_index].sentence_index != mention.sentence_index:
-                activity_index = self.get_next_index_of_mention_with_tag(document, i + 1, [self._activity])
+                activity_index = self.get_next_index_of_mention_with_tag(document, i + 1, self._activity)
 
             if activity_index is None or document.mentions[activity_index].sentence_index != mention.sentence_index:
                 continue
@@ -1,97 +1,137 @@
-import functools
-import itertools
+import argparse
 import math
 import random
-import timeit
+import time
 import typing
 
 import numpy as np
 
 import data
 
+# upper bounds of the (absolute) mention distance buckets negative samples are stratified by
+_DISTANCE_BUCKETS = np.array([1, 2, 4, 8, 16], dtype=np.int64)
 
-def negative_sample_np(document: data.Document, num_positive: int, negative_rate: float,
-                       verbose: bool = False) -> typing.List[typing.Tuple[int, int]]:
+
+def negative_candidates(document: data.Document) -> np.ndarray:
     """
-    scales better with large negative sampling rates, but slower for smaller ones (<10k)
-    :param document:
-    :param num_positive:
-    :param negative_rate:
-    :param verbose:
-    :return:
+    All ordered (head, tail) pairs of distinct mentions, whose entities are not related,
+    i.e. there is no relation between any mention of the head's entity and any mention
+    of the tail's entity. Mentions without entity count as an entity of their own.
     """
-    num_negative_samples = math.ceil(negative_rate * num_positive)
-
-    forward_candidates = np.array(list(itertools.combinations(range(len(document.mentions)), 2)))
-    backward_candidates = forward_candidates.copy()
-    backward_candidates[:, [0, 1]] = backward_candidates[:, [1, 0]]
-    candidates = np.concatenate([forward_candidates, backward_candidates])
-
-    negative_samples_mask_fn = functools.partial(_is_negative_sample, document=document)
-    negative_samples_mask = candidates.copy()
-    np.apply_along_axis(negative_samples_mask_fn, 1, candidates)
-
-    candidates = candidates[negative_samples_mask]
-
-    num_candidates = candidates.shape[0]
-    negative_sample_indices = np.random.choice(num_candidates, num_negative_samples, replace=True)
-
-    candidates = candidates[negative_sample_indices, :].tolist()
-    return candidates
+    num_mentions = len(document.mentions)
+    if num_mentions < 2:
+        return np.zeros((0, 2), dtype=np.int64)
+
+    # mentions without entity get an id after all entities
+    entity_ids = np.array([
+        entity_index if entity_index is not None else len(document.entities) + mention_index
+        for mention_index, entity_index in enumerate(document.entity_indices_for_mentions())
+    ], dtype=np.int64)
+    _, entity_ids = np.unique(entity_ids, return_inverse=True)
+    num_entities = entity_ids.max() + 1
+
+    related = np.zeros((num_entities, num_entities), dtype=bool)
+    if len(document.relations) > 0:
+        heads = np.array([r.head_mention_index for r in document.relations], dtype=np.int64)
+        tails = np.array([r.tail_mention_index for r in document.relations], dtype=np.int64)
+        related[entity_ids[heads], entity_ids[tails]] = True
+
+    mask = ~related[entity_ids[:, None], entity_ids[None, :]]
+    np.fill_diagonal(mask, False)
+    return np.argwhere(mask)
+
+
+def _strata(document: data.Document, pairs: np.ndarray) -> np.ndarray:
+    """
+    Stratum of each pair, a combination of head tag, tail tag and signed mention distance bucket.
+    """
+    tag_ids = np.array([m.ner_tag_id for m in document.mentions], dtype=np.int64)
+    distances = pairs[:, 1] - pairs[:, 0]
+    buckets = np.sign(distances) * (np.searchsorted(_DISTANCE_BUCKETS, np.abs(distances)) + 1)
+    num_buckets = 2 * (len(_DISTANCE_BUCKETS) + 1) + 1
+    num_tags = tag_ids.max() + 1
+    return (tag_ids[pairs[:, 0]] * num_tags + tag_ids[pairs[:, 1]]) * num_buckets + buckets + num_buckets // 2
 
 
-def _is_negative_sample(row: np.ndarray, document: data.Document) -> np.ndarray:
-    head_mention_index: int = row[0]
-    tail_mention_index: int = row[1]
-    head_index = document.entity_index_for_mention_index(head_mention_index)
-    tail_index = document.entity_index_for_mention_index(tail_mention_index)
-    relation_exists = document.relation_exists_between(head_index, tail_index)
+def _stratified_sample(strata: np.ndarray, num_samples: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Draws num_samples of the given items without replacement, each stratum contributes
+    in proportion to its size, remaining samples go to the largest remainders.
 
-    if relation_exists:
-        return np.array([False, False])
-    return np.array([True, True])
+    :returns: indices of the drawn items
+    """
+    stratum_ids, item_strata, stratum_sizes = np.unique(strata, return_inverse=True, return_counts=True)
+    quotas = stratum_sizes * num_samples / len(strata)
+    allocated = np.floor(quotas).astype(np.int64)
+    remaining = num_samples - allocated.sum()
+    if remaining > 0:
+        # random tie breaking between equal remainders
+        order = np.lexsort((rng.random(len(stratum_ids)), -(quotas - allocated)))
+        allocated[order[:remaining]] += 1
+
+    # random order within each stratum, then take the first items of each
+    order = np.lexsort((rng.random(len(strata)), item_strata))
+    stratum_starts = np.concatenate([[0], np.cumsum(stratum_sizes)[:-1]])
+    ranks = np.empty(len(strata), dtype=np.int64)
+    ranks[order] = np.arange(len(strata)) - stratum_starts[item_strata[order]]
+    return np.flatnonzero(ranks < allocated[item_strata])
 
 
 def negative_sample(document: data.Document, num_positive: int, negative_rate: float,
-                    verbose: bool = False) -> typing.List[typing.Tuple[int, int]]:
-    num_negative_samples = math.ceil(negative_rate * num_positive)
-    negative_samples = []
-
-    candidates = list(itertools.combinations(range(len(document.mentions)), 2))
-    candidates += [(t, h) for h, t in candidates]
-
-    for head_mention_index, tail_mention_index in candidates:
-        if len(negative_samples) >= num_negative_samples:
-            break
-
-        head_index = document.entity_index_for_mention_index(head_mention_index)
-        tail_index = document.entity_index_for_mention_index(tail_mention_index)
-        if document.relation_exists_between(head_index, tail_index):
-            continue
-
-        negative_samples.append((head_mention_index, tail_mention_index))
-
-    if len(negative_samples) < num_negative_samples:
-        if verbose:
-            print(f'Could only build {len(negative_samples)}/{num_negative_samples} '
-                  f'negative samples, as there were not enough candidates in {document.name}, '
-                  f'reusing some.')
-        missing_num_samples = num_negative_samples - len(negative_samples)
-        while missing_num_samples > 0:
-            negative_samples += negative_samples[:missing_num_samples]
-            missing_num_samples = num_negative_samples - len(negative_samples)
-
-        random.shuffle(negative_samples)
+                    verbose: bool = False,
+                    rng: typing.Optional[np.random.Generator] = None) -> typing.List[typing.Tuple[int, int]]:
+    """
+    Randomly draws ceil(negative_rate * num_positive) mention pairs without a relation
+    between their entities (see negative_candidates), stratified by head tag, tail tag and
+    mention distance. If there are not enough candidates, all of them are used (repeatedly).
 
-    return negative_samples
+    :param rng: random number generator to draw with, seeded from the random module if not given
+    :returns: (head mention index, tail mention index) pairs, in random order
+    """
+    if rng is None:
+        rng = np.random.default_rng(random.getrandbits(64))
+    num_negative_samples = math.ceil(negative_rate * num_positive)
+    candidates = negative_candidates(document)
+    if num_negative_samples == 0 or len(candidates) == 0:
+        return []
+
+    num_repeats, num_drawn = divmod(num_negative_samples, len(candidates))
+    if num_negative_samples > len(candidates) and verbose:
+        print(f'Could only build {len(candidates)}/{num_negative_samples} '
+              f'negative samples, as there were not enough candidates in {document.name}, '
+              f'reusing some.')
+    drawn = _stratified_sample(_strata(document, candidates), num_drawn, rng)
+    indices = np.concatenate([np.tile(np.arange(len(candidates)), num_repeats), drawn])
+    rng.shuffle(indices)
+    return [(head, tail) for head, tail in candidates[indices].tolist()]
+
+
+def benchmark(documents: typing.List[data.Document], negative_rates: typing.Sequence[float],
+              number: int = 3) -> typing.Dict[float, float]:
+    """
+    :returns: negative rate -> average seconds to sample negatives for all documents
+    """
+    timings = {}
+    for negative_rate in negative_rates:
+        start = time.perf_counter()
+        num_samples = 0
+        for _ in range(number):
+            for document in documents:
+                num_samples += len(negative_sample(document, len(document.relations), negative_rate))
+        timings[negative_rate] = (time.perf_counter() - start) / number
+        print(f'negative rate {negative_rate}: {timings[negative_rate]:.3f}s '
+              f'for {num_samples // number} samples from {len(documents)} documents')
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures the speed of negative sampling.')
+    parser.add_argument('json_path', nargs='?', default='../jsonl/fold_0/train.json')
+    parser.add_argument('--negative-rates', type=float, nargs='+', default=[1.0, 40.0, 10000.0])
+    parser.add_argument('--number', type=int, default=3)
+    args = parser.parse_args()
+    benchmark(data.loader.read_documents_from_json_file(args.json_path), args.negative_rates, args.number)
 
 
 if __name__ == '__main__':
-    documents_ = data.loader.read_documents_from_json(f'../jsonl/fold_0/train.json')
-
-    print('numpy')
-    print(timeit.timeit(lambda: [negative_sample_np(doc_, len(doc_.relations), 10000.0) for doc_ in documents_],
-                        number=1))
-    print('plain python')
-    print(timeit.timeit(lambda: [negative_sample(doc_, len(doc_.relations), 10000.0) for doc_ in documents_],
-                        number=1))
+    main()
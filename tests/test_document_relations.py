@@ -0,0 +1,48 @@
+import pytest
+
+import data
+
+
+def _document() -> data.Document:
+    tokens = [data.Token(text=t, index_in_document=i, pos_tag='NN', sentence_index=0)
+              for i, t in enumerate(['clerk', 'checks', 'invoice', 'manager'])]
+    return data.Document(
+        id='1', category='', text=' '.join(t.text for t in tokens), name='doc',
+        tokens=tokens,
+        mentions=[data.Mention('Actor', [0]), data.Mention('Activity', [1]),
+                  data.Mention('Activity Data', [2]), data.Mention('Actor', [3])],
+        relations=[data.Relation(1, 0, 'actor performer'),
+                   data.Relation(1, 2, 'uses'),
+                   data.Relation(3, 1, 'flow'),
+                   data.Relation(1, 3, 'actor recipient')],
+    )
+
+
+def test_get_relations_by_mention_returns_relations_in_document_order():
+    document = _document()
+    assert document.get_relations_by_mention(1) == [document.relations[i] for i in [0, 1, 2, 3]]
+    assert document.get_relations_by_mention(3) == [document.relations[i] for i in [2, 3]]
+
+
+def test_get_relations_by_mention_only_head():
+    document = _document()
+    assert document.get_relations_by_mention(1, only_head=True) == [document.relations[i] for i in [0, 1, 3]]
+    assert document.get_relations_by_mention(0, only_head=True) == []
+
+
+def test_get_relations_by_mention_only_tail():
+    document = _document()
+    assert document.get_relations_by_mention(1, only_tail=True) == [document.relations[2]]
+    assert document.get_relations_by_mention(0, only_tail=True) == [document.relations[0]]
+
+
+def test_get_relations_by_mention_only_head_and_only_tail():
+    with pytest.raises(ValueError):
+        _document().get_relations_by_mention(1, only_head=True, only_tail=True)
+
+
+def test_get_relations_by_mention_sees_added_relations():
+    document = _document()
+    document.get_relations_by_mention(2)
+    document.relations.append(data.Relation(2, 3, 'flow'))
+    assert document.get_relations_by_mention(2, only_head=True) == [document.relations[4]]
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds importing the packages may take, models and heavy dependencies are loaded on first use
+IMPORT_TIME_BUDGET = 1.0
+LAZY_MODULES = ['spacy', 'catboost', 'gensim']
+
+_IMPORT_SCRIPT = f"""
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import data
+import coref
+import relations
+import pipeline
+duration = time.perf_counter() - start
+
+print(json.dumps({{
+    "duration": duration,
+    "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def test_import_time_budget():
+    # pipeline needs the crf estimator, which can not be imported lazily
+    pytest.importorskip('pycrfsuite')
+
+    # fresh interpreter, so nothing is imported yet
+    completed = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT], cwd=REPOSITORY_ROOT,
+                               capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert result['loaded'] == [], f'Importing the packages loaded {result["loaded"]}'
+    assert result['duration'] < IMPORT_TIME_BUDGET, \
+        f'Importing the packages took {result["duration"]:.2f}s, budget is {IMPORT_TIME_BUDGET:.2f}s'